@@ -1,8 +1,7 @@
 from __future__ import annotations
-from enum import Enum
 import glob
-import json
 import os
+import sys
 from typing import *
 
 from PyQt5.QtCore import *
@@ -10,7 +9,7 @@ from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
 import pyqtgraph as pg
 
-from etterna_graph import plotter, util
+from etterna_graph import util
 from etterna_graph.settings import (
     Settings,
     SettingsDialog,
@@ -59,6 +58,9 @@ class UI:
         )
         pg.setConfigOption("background", util.bg_color())
         pg.setConfigOption("foreground", util.text_color())
+        # Antialiasing makes painting thousands of scatter points a lot slower. It's
+        # pyqtgraph's default to have it off, but don't rely on that
+        pg.setConfigOption("antialias", False)
 
         main_menu = window.menuBar().addMenu("File")
         main_menu.addAction("Settings").triggered.connect(
@@ -134,6 +136,16 @@ class Application:
 
     def run(self) -> None:
         self._prefs = Settings.load_from_json()
+        util.set_prefs(self._prefs)
+        if self._prefs.use_opengl:
+            try:
+                import OpenGL  # pyqtgraph's OpenGL rendering needs PyOpenGL
+
+                pg.setConfigOption("useOpenGL", True)
+            except ImportError:
+                util.logger.warning(
+                    "OpenGL rendering is enabled but PyOpenGL isn't installed"
+                )
         self._ui = UI()
 
         if self._prefs.is_incomplete():
@@ -145,6 +157,11 @@ class Application:
 
         self._prefs.save_to_json()
 
+        # Imported only now: the plotter pulls in numpy, the data generators and the
+        # Rust extension, none of which are needed if the user backs out of choosing the
+        # paths above
+        from etterna_graph import plotter
+
         box_container, plot_container = self._ui.get_box_container_and_plot_container()
         self._pg_plots = plotter.draw(
             self._ui.get_qapp(), box_container, plot_container, self._prefs
@@ -205,15 +222,21 @@ class Application:
     # Detects an Etterna installation and sets xml_path and
     # replays_dir to the paths in it
     def try_detect_etterna(self):
-        globs = [
-            "C:\\Games\\Etterna*",  # Windows
-            "C:\\Users\\*\\AppData\\*\\etterna*",  # Windows
-            os.path.expanduser("~") + "/.etterna*",  # Linux
-            os.path.expanduser("~") + "/.stepmania*",  # Linux
-            "/opt/etterna*",  # Linux
-            "Y:\\.etterna*",  # My Wine on Linux (for testing)
-            os.path.expanduser("~") + "/Library/Preferences/Etterna*",  # Mac
-        ]
+        # Only look where an installation on this OS can actually be
+        if sys.platform == "win32":
+            globs = [
+                "C:\\Games\\Etterna*",
+                "C:\\Users\\*\\AppData\\*\\etterna*",
+                "Y:\\.etterna*",  # My Wine on Linux (for testing)
+            ]
+        elif sys.platform == "darwin":
+            globs = [os.path.expanduser("~") + "/Library/Preferences/Etterna*"]
+        else:
+            globs = [
+                os.path.expanduser("~") + "/.etterna*",
+                os.path.expanduser("~") + "/.stepmania*",
+                "/opt/etterna*",
+            ]
         # Assemble all possible save game locations. path_tuples is a
         # list of tuples `(xml_path, replays_dir_path, songs_root)`
         path_tuples: list[tuple[str, str, str]] = []
@@ -221,11 +244,19 @@ class Application:
             for path in glob.iglob(glob_str):
                 replays_dir = path + "/Save/ReplaysV2"
                 songs_root = path + "/Songs"
-                possible_xml_paths = glob.iglob(
-                    path + "/Save/LocalProfiles/*/Etterna.xml"
-                )
-                for xml_path in possible_xml_paths:
-                    path_tuples.append((xml_path, replays_dir, songs_root))
+                # A plain directory listing is enough for the profiles, no need for
+                # pattern matching
+                try:
+                    profiles = os.scandir(path + "/Save/LocalProfiles")
+                except OSError:
+                    continue
+                with profiles:
+                    for profile in profiles:
+                        if profile.name.startswith("."):
+                            continue  # like the `*` glob did, skip hidden entries
+                        xml_path = profile.path + "/Etterna.xml"
+                        if os.path.isfile(xml_path):
+                            path_tuples.append((xml_path, replays_dir, songs_root))
 
         if len(path_tuples) == 0:
             return  # No installation could be found
@@ -242,8 +273,12 @@ class Application:
             path_pair = path_tuples[0]
         else:  # With multiple possible installations, it's tricky
             # Select the savegame pair with the largest XML, ask user if that one is right
-            path_pair = max(path_tuples, key=lambda pair: os.path.getsize(pair[0]))
-            mibs = os.path.getsize(path_pair[0]) / 1024**2  # MiB's
+            # (stat every XML only once, the size is needed again for the message)
+            xml_size, path_pair = max(
+                ((os.path.getsize(pair[0]), pair) for pair in path_tuples),
+                key=lambda size_and_pair: size_and_pair[0],
+            )
+            mibs = xml_size / 1024**2  # MiB's
             text = f"Found {len(path_tuples)} Etterna.xml's. The largest one \n({path_pair[0]})\nis {mibs:.2f} MiB; should the program use that?"
             reply = QMessageBox.question(
                 None, "Which Etterna.xml?", text, QMessageBox.Yes, QMessageBox.No
@@ -1,13 +1,26 @@
-from datetime import datetime
+import functools
 import math
 from typing import *
 
+import numpy as np
 import pyqtgraph as pg
-from pyqtgraph.graphicsItems.PlotItem import PlotItem
+from pyqtgraph.icons import invisibleEye
+from pyqtgraph.Qt.QtCore import QPoint, QPointF, QRectF, Qt
+from pyqtgraph.Qt.QtGui import QBrush, QColor, QPainter, QPen, QPicture
 
 from . import app
 from . import util
 
+if TYPE_CHECKING:
+    from pyqtgraph.graphicsItems.PlotItem import PlotItem
+
+try:  # pyqtgraph can run some of its inner loops through numba, if it's installed
+    import numba  # noqa: F401
+
+    pg.setConfigOption("useNumba", True)
+except ImportError:
+    pass
+
 
 """
 This file handles all graphics library interaction through the classes
@@ -15,6 +28,48 @@ PlotFrame, Plot and TextBox (and the internal utility classes
 TimeAxisItem and DIYLogAxisItem)
 """
 
+# (y position, color) of the horizontal grade threshold lines on accuracy plots. The y
+# axis of those is -log10(100 - percent)
+_ACCURACY_THRESHOLD_LINES = tuple(
+    (-math.log10(100 - percent), line_color)
+    for percent, line_color in [
+        (60.00, "#c97bff"),
+        (70.00, "#5b78bb"),
+        (80.00, "#da5757"),
+        (93.00, "#66cc66"),
+        (99.75, "#eebb00"),
+        (99.97, "#66ccff"),
+        (99.999, "#ffffff"),
+    ]
+)
+
+# Pens by (color, width). pyqtgraph copies the pens it's given, so one instance can be
+# reused for every item and every plot drawn with the same color and width
+_pen_cache: dict[tuple[Any, int], QPen] = {}
+
+
+def _pen(color: str | QColor, width: int) -> QPen:
+    # QColor isn't hashable, so it's keyed by its ARGB value
+    key = (color.rgba() if isinstance(color, QColor) else color, width)
+    if (pen := _pen_cache.get(key)) is None:
+        pen = _pen_cache[key] = pg.mkPen(color, width=width)
+    return pen
+
+
+# Colors by (color spec, alpha). The returned QColor is shared, so it must not be
+# modified
+@functools.lru_cache(maxsize=512)
+def _qcolor(color: str, alpha: float) -> QColor:
+    qcolor = pg.mkColor(color)
+    # rounds like Qt does everywhere else, unlike int(alpha * 255)
+    qcolor.setAlphaF(alpha)
+    return qcolor
+
+
+@functools.lru_cache(maxsize=None)
+def _brush(color: str, alpha: float) -> QBrush:
+    return QBrush(_qcolor(color, alpha))
+
 
 class TimeAxisItem(pg.AxisItem):
     def __init__(self, *args, **kwargs):
@@ -25,14 +80,154 @@ class TimeAxisItem(pg.AxisItem):
     def tickStrings(self, values, _scale, _spacing):
         # Cap timestamp to 32 bit to prevent crash on Windows from
         # out-of-bounds dates
-        capmin = 0
-        capmax = (2**31) - 1
+        values = np.clip(np.asarray(values, dtype=np.float64), 0, (2**31) - 1)
+
+        from datetime import datetime  # only needed once there's something to plot
+
+        fromtimestamp = datetime.fromtimestamp
+        return [fromtimestamp(value).strftime("%Y-%m-%d") for value in values.tolist()]
+
+
+# Fixed lines spanning the whole view: horizontal ones at given y positions and
+# optionally the x=y diagonal. All of them are painted by this one item, instead of one
+# InfiniteLine (with all its hover and drag machinery) per line
+class StaticLinesItem(pg.GraphicsObject):
+    def __init__(
+        self,
+        horizontal_lines: Iterable[tuple[float, str]] = (),
+        diagonal_color: str | None = None,
+    ):
+        super().__init__()
+        self._horizontal_lines = [(y, _pen(color, 1)) for y, color in horizontal_lines]
+        self._diagonal_pen = _pen(diagonal_color, 1) if diagonal_color else None
+
+        # like horizontal InfiniteLines, the lines take part in the y autorange but not
+        # in the x one. The diagonal takes part in neither
+        y_values = [y for y, _ in self._horizontal_lines]
+        self._y_bounds = (min(y_values), max(y_values)) if y_values else None
+
+    def dataBounds(self, axis, frac=1.0, orthoRange=None):
+        return None if axis == 0 else self._y_bounds
+
+    def viewRangeChanged(self):
+        super().viewRangeChanged()
+        self.prepareGeometryChange()  # the bounding rect is the visible area
+
+    def boundingRect(self):
+        view_rect = self.viewRect()
+        return QRectF() if view_rect is None else view_rect
+
+    def paint(self, painter, *_args):
+        rect = self.boundingRect()
+        left, right = rect.left(), rect.right()
+        for y, pen in self._horizontal_lines:
+            painter.setPen(pen)
+            painter.drawLine(QPointF(left, y), QPointF(right, y))
+
+        if self._diagonal_pen is not None:
+            # only the part of x=y that's within the visible area
+            start, end = max(left, rect.top()), min(right, rect.bottom())
+            if start < end:
+                painter.setPen(self._diagonal_pen)
+                painter.drawLine(QPointF(start, start), QPointF(end, end))
+
+
+# All layers of a stacked bar chart in one item. The rectangles are built once and
+# recorded into a QPicture that's replayed on every paint, instead of having one
+# BarGraphItem per layer
+class StackedBarItem(pg.GraphicsObject):
+    # x: bar centers; layers: one row of bar heights per layer, bottom layer first
+    def __init__(self, x, layers: np.ndarray, width: float, colors: list[str]):
+        super().__init__()
+        x_starts = (np.asarray(x, dtype=np.float64) - width / 2).tolist()
+        # the bottom of each layer is the running sum of the layers below it
+        bottoms = np.zeros_like(layers)
+        np.cumsum(layers[:-1], axis=0, out=bottoms[1:])
+
+        self._layer_rects = [
+            [
+                QRectF(x_start, bottom, width, height)
+                for x_start, bottom, height in zip(
+                    x_starts, layer_bottoms.tolist(), layer.tolist()
+                )
+            ]
+            for layer, layer_bottoms in zip(layers, bottoms)
+        ]
+        self.pens = [_pen(color, 1) for color in colors]
+        self.brushes = [pg.mkBrush(color) for color in colors]
+        self._hidden_layers: set[int] = set()
+        self._picture: QPicture | None = None
+
+        if len(x_starts) == 0 or layers.size == 0:
+            self._bounds = None
+        else:
+            tops = bottoms + layers
+            self._bounds = (
+                (min(x_starts), max(x_starts) + width),
+                (
+                    float(min(bottoms.min(), tops.min())),
+                    float(max(bottoms.max(), tops.max())),
+                ),
+            )
+
+    def is_layer_visible(self, layer_i: int) -> bool:
+        return layer_i not in self._hidden_layers
 
-        strings = []
-        for value in values:
-            value = min(capmax, max(capmin, value))
-            strings.append(datetime.fromtimestamp(value).strftime("%Y-%m-%d"))
-        return strings
+    def set_layer_visible(self, layer_i: int, visible: bool) -> None:
+        if visible:
+            self._hidden_layers.discard(layer_i)
+        else:
+            self._hidden_layers.add(layer_i)
+        self._picture = None  # needs to be recorded again
+        self.update()
+
+    def dataBounds(self, axis, frac=1.0, orthoRange=None):
+        return (None, None) if self._bounds is None else self._bounds[axis]
+
+    def boundingRect(self):
+        if self._bounds is None:
+            return QRectF()
+        (x_min, x_max), (y_min, y_max) = self._bounds
+        return QRectF(x_min, y_min, x_max - x_min, y_max - y_min)
+
+    def paint(self, painter, *_args):
+        if self._picture is None:
+            self._picture = QPicture()
+            picture_painter = QPainter(self._picture)
+            for layer_i, rects in enumerate(self._layer_rects):
+                if layer_i in self._hidden_layers:
+                    continue
+                picture_painter.setPen(self.pens[layer_i])
+                picture_painter.setBrush(self.brushes[layer_i])
+                picture_painter.drawRects(rects)
+            picture_painter.end()
+        self._picture.play(painter)
+
+
+# Legend entry for one layer of a StackedBarItem. Clicking it hides or shows that layer,
+# like the legend does with regular plot items
+class StackedBarLegendSample(pg.ItemSample):
+    def __init__(self, item: StackedBarItem, layer_i: int):
+        super().__init__(item)
+        self._layer_i = layer_i
+
+    def paint(self, painter, *_args):
+        if not self.item.is_layer_visible(self._layer_i):
+            painter.drawPixmap(QPoint(1, 1), invisibleEye.qicon.pixmap(18, 18))
+            return
+        # same look as the legend sample of a BarGraphItem
+        painter.setPen(self.item.pens[self._layer_i])
+        painter.drawLine(0, 11, 20, 11)
+        painter.setBrush(self.item.brushes[self._layer_i])
+        painter.drawRect(QRectF(2, 2, 18, 18))
+
+    def mouseClickEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.item.set_layer_visible(
+                self._layer_i, not self.item.is_layer_visible(self._layer_i)
+            )
+        event.accept()
+        self.update()
 
 
 class DIYLogAxisItem(pg.AxisItem):
@@ -56,32 +251,84 @@ class DIYLogAxisItem(pg.AxisItem):
         self.postfix = postfix
         self.max_shown_value = max_shown_value
         self.min_shown_value = min_shown_value
+        # The labels for out-of-range ticks never change, so they're formatted once here
+        self._max_string = f"{round(max_shown_value, decimal_places)}{postfix}+"
+        self._min_string = (
+            f"less than {round(min_shown_value, decimal_places)}{postfix}"
+        )
 
     def tickStrings(self, values, _scale, _spacing):
-        result = []
-        for value in values:
+        values = np.asarray(values, dtype=np.float64)
+        with np.errstate(over="ignore"):  # when zoomed out very far
             if self.accuracy:
-                value = 100 - 10**-value
+                values = 100 - np.power(10.0, -values)
             else:
-                value = 10**value
+                values = np.power(10.0, values)
+
+        decimal_places, postfix = self.decimal_places, self.postfix
+        result = [
+            _tick_label(value, decimal_places, postfix) for value in values.tolist()
+        ]
+
+        # Values outside of the shown range are rare, so only those ticks get their
+        # string swapped
+        for i in np.flatnonzero(values > self.max_shown_value).tolist():
+            result[i] = self._max_string
+        for i in np.flatnonzero(values < self.min_shown_value).tolist():
+            result[i] = self._min_string
+        return result
 
-            if value > self.max_shown_value:
-                string = (
-                    str(round(self.max_shown_value, self.decimal_places))
-                    + self.postfix
-                    + "+"
-                )
-            elif value < self.min_shown_value:
-                string = (
-                    "less than "
-                    + str(round(self.min_shown_value, self.decimal_places))
-                    + self.postfix
-                )
-            else:
-                string = str(round(value, self.decimal_places)) + self.postfix
 
-            result.append(string)
-        return result
+# Label of a single in-range DIYLogAxisItem tick. The ticks sit at multiples of the
+# tick spacing, so while panning and zooming the same few values come up again and
+# again; caching their labels skips the string formatting for those
+@functools.lru_cache(maxsize=256)
+def _tick_label(value: float, decimal_places: int, postfix: str) -> str:
+    return f"{round(value, decimal_places)}{postfix}"
+
+
+# Slot for the sigClicked signal of scatter items. Lives at module level and gets the
+# callback bound with functools.partial, so that draw() doesn't create a new closure for
+# every chart
+def _on_points_clicked(click_callback: Callable, _item, points) -> None:
+    if len(points) > 1:
+        app.app.set_infobar(f"{len(points)} points selected at once!")
+        return
+    try:
+        click_callback(points[0].data())
+    except Exception:
+        util.logger.exception("Click handler")
+        app.app.set_infobar("[Error while generating info text]")
+
+
+# Builders for the plot item of the single-series chart types, looked up by `type_` in
+# draw(). color: the QColor or the list of per-point QBrushes of the series
+def _scatter_item(x, y, color, flags: frozenset[str], ids, sizes, width: float):
+    return pg.ScatterPlotItem(x, y, pen=None, size=8, brush=color, data=ids)
+
+
+def _bubble_item(x, y, color, flags: frozenset[str], ids, sizes, width: float):
+    return pg.ScatterPlotItem(x, y, pen=None, size=sizes, brush=color, data=ids)
+
+
+def _bar_item(x, y, color, flags: frozenset[str], ids, sizes, width: float):
+    x_values = x + 0.5 if "align_to_whole" in flags else x
+    return pg.BarGraphItem(
+        x=x_values, height=y, width=width, pen=(200, 200, 200), brush=color
+    )
+
+
+def _line_item(x, y, color, flags: frozenset[str], ids, sizes, width: float):
+    line_width = 3 if "thick_line" in flags else 1
+    return pg.PlotDataItem(x, y, pen=_pen(color, line_width), stepMode="step" in flags)
+
+
+_SERIES_ITEMS = {
+    "scatter": _scatter_item,
+    "bubble": _bubble_item,
+    "bar": _bar_item,
+    "line": _line_item,
+}
 
 
 # mapper: function that turns xml into data points
@@ -108,6 +355,10 @@ def draw(
     width: float = 0.8,
 ):
 
+    # Split once, so that every flag check below is a set lookup instead of a substring
+    # search
+    flags = frozenset(flags.split())
+
     log_axis_kwargs = {}
     if log_axis_max_shown_value:
         log_axis_kwargs["max_shown_value"] = log_axis_max_shown_value
@@ -139,23 +390,21 @@ def draw(
         )
 
     plot_widget = pg.PlotWidget(axisItems=axisItems)
-    plot: PlotItem = plot_widget.getPlotItem()
+    plot: "PlotItem" = plot_widget.getPlotItem()
     plot.setTitle(title)
+    # For big line plots: only process the visible part and thin it out to what the
+    # screen can actually show. Applies to every PlotDataItem added to the plot. Step
+    # plots are left alone, because pyqtgraph clips and downsamples their x and y to
+    # the same length, which a stepped curve (one more x than y) rejects on every view
+    # change
+    if "large" in flags and "step" not in flags:
+        plot.setClipToView(True)
+        plot.setDownsampling(ds=True, auto=True, mode="peak")
     if "log" in flags:
         plot.setLogMode(x=False, y=True)  # does this do anything? idk
 
     if "diagonal_line" in flags:
-        plot.addItem(pg.InfiniteLine(pos=(0, 0), angle=45, pen="w"))
-
-    def click_handler(_, points):
-        if len(points) > 1:
-            app.app.set_infobar(f"{len(points)} points selected at once!")
-        elif click_callback is not None:
-            try:
-                (click_callback)(points[0].data())
-            except Exception:
-                util.logger.exception("Click handler")
-                app.app.set_infobar("[Error while generating info text]")
+        plot.addItem(StaticLinesItem(diagonal_color="w"))
 
     # ~ plot.clear()
 
@@ -165,95 +414,81 @@ def draw(
         return
 
     ids = None
+    sizes = None
 
     # We may have ids given which we need to separate
     if click_callback is not None:
         (data, ids) = data
     if type_ == "bubble":
         (x, y, sizes) = data
+        sizes = np.asarray(sizes, dtype=np.float64)
     else:
         (x, y) = data
 
     if "time_xaxis" in flags and x is not None:
-        x = [value.timestamp() for value in x]
+        # Straight into a float array, which is what pyqtgraph works with internally
+        # anyway
+        x = np.fromiter(
+            (value.timestamp() for value in x), dtype=np.float64, count=len(x)
+        )
 
     step_mode = "step" in flags
     if step_mode and x is not None:
-        x = [*x, x[-1]]  # Duplicate last element to satisfy pyqtgraph with stepMode
+        # Duplicate last element to satisfy pyqtgraph with stepMode
+        x = np.append(x, x[-1])
         # Out-of-place to avoid modifying the passed-in list
 
+    # pyqtgraph converts everything to float arrays internally. Doing it once up front
+    # lets every item below take its fast path (and is free if an array was passed in
+    # already)
+    if x is not None:
+        x = np.asarray(x, dtype=np.float64)
+
     if legend is not None:
         plot.addLegend()
         plot.legend.setBrush(app.app.prefs.legend_bg_color)
         plot.legend.setPen(util.border_color())
 
     if type_ == "stacked bar" and y is not None:
-        num_cols = len(y)
-        y = list(zip(*y))
-        bottom = [0] * num_cols
-        for row_i, row in enumerate(y):
-            # item = pg.BarGraphItem(x=x, y0=bottom, height=row, width=1, pen=(0,0,0,255), brush=color[row_i])
-            item = pg.BarGraphItem(
-                x=x,
-                y0=bottom,
-                height=row,
-                width=width,
-                pen=color[row_i],
-                brush=color[row_i],
-            )
-            bottom = [a + b for (a, b) in zip(bottom, row)]  # We need out-of-place here
-            if legend is not None:
-                plot.legend.addItem(item, legend[row_i])
-            plot.addItem(item)
+        # y has one row of layer values per x. Transpose it into one row per layer
+        layers = np.asarray(y, dtype=np.float64).T
+        item = StackedBarItem(x, layers, width, color[: len(layers)])
+        if legend is not None:
+            for row_i in range(len(layers)):
+                plot.legend.addItem(StackedBarLegendSample(item, row_i), legend[row_i])
+        plot.addItem(item)
     elif type_ == "stacked line":
-        num_cols = len(y)
-        y = list(zip(*y))
+        # One row per layer, like in the stacked bar case. The rows are handed to
+        # pyqtgraph as array views, no copies
+        layers = np.asarray(y, dtype=np.float64).T
         # Iterate in reverse so that overall comes last and draws
         # above the rest
-        for row_i, row in reversed(list(enumerate(y))):
+        for row_i in range(len(layers) - 1, -1, -1):
             # ~ item = pg.PlotCurveItem(x=x, y=list(row), pen=color[row_i], brush=color[row_i], stepMode=step_mode)
             width = 3 if row_i == 0 else 1
-            pen = pg.mkPen(color[row_i], width=width)
-            item = pg.PlotCurveItem(x=x, y=list(row), pen=pen, stepMode=step_mode)
+            pen = _pen(color[row_i], width)
+            item = pg.PlotCurveItem(x=x, y=layers[row_i], pen=pen, stepMode=step_mode)
             if legend is not None:
                 plot.legend.addItem(item, legend[row_i])
             plot.addItem(item)
     else:
+        y = np.asarray(y, dtype=np.float64)
         if isinstance(color, list):
-            for i in range(len(color)):
-                color[i] = pg.mkColor(color[i])
-                color[i].setAlphaF(alpha)
+            # Per-point colors usually repeat a lot, so each distinct one is only turned
+            # into a brush once. Out-of-place to avoid modifying the passed-in list
+            color = [_brush(c, alpha) for c in color]
         else:
-            color = pg.mkColor(color)
-            color.setAlphaF(alpha)
-        if type_ == "scatter":
-            item = pg.ScatterPlotItem(x, y, pen=None, size=8, brush=color, data=ids)
-        elif type_ == "bar":
-            x_values = [v + 0.5 for v in x] if "align_to_whole" in flags else x
-            item = pg.BarGraphItem(
-                x=x_values, height=y, width=width, pen=(200, 200, 200), brush=color
-            )
-        elif type_ == "bubble":
-            item = pg.ScatterPlotItem(x, y, pen=None, size=sizes, brush=color, data=ids)
-        elif type_ == "line":
-            width = 3 if "thick_line" in flags else 1
-            item = pg.PlotDataItem(
-                x, y, pen=pg.mkPen(color, width=width), stepMode=step_mode
-            )
-
+            color = _qcolor(color, alpha)
+        item = _SERIES_ITEMS[type_](x, y, color, flags, ids, sizes, width)
         if click_callback is not None:
-            item.sigClicked.connect(click_handler)
+            item.sigClicked.connect(
+                functools.partial(_on_points_clicked, click_callback)
+            )
         plot.addItem(item)
 
     # Add horizontal score threshold lines
     if "accuracy_yaxis" in flags:
-        plot.addLine(y=-(math.log(100 - 60.00) / math.log(10)), pen="#c97bff")
-        plot.addLine(y=-(math.log(100 - 70.00) / math.log(10)), pen="#5b78bb")
-        plot.addLine(y=-(math.log(100 - 80.00) / math.log(10)), pen="#da5757")
-        plot.addLine(y=-(math.log(100 - 93.00) / math.log(10)), pen="#66cc66")
-        plot.addLine(y=-(math.log(100 - 99.75) / math.log(10)), pen="#eebb00")
-        plot.addLine(y=-(math.log(100 - 99.97) / math.log(10)), pen="#66ccff")
-        plot.addLine(y=-(math.log(100 - 99.999) / math.log(10)), pen="#ffffff")
+        plot.addItem(StaticLinesItem(horizontal_lines=_ACCURACY_THRESHOLD_LINES))
 
     plot.autoBtnClicked()
     plot.showGrid(x=True, y=True, alpha=0.15)
@@ -1,13 +1,20 @@
 from collections import Counter
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+import functools
+import heapq
 import math
+import re
 from typing import *
-from xml.etree.ElementTree import Element
+
+from lxml import etree
+from lxml.etree import _Element as Element
+import numpy as np
 
 from etterna_graph import app, util
 from etterna_graph.replays_analysis import ReplaysAnalysis
 from etterna_graph.replays_analysis import FastestCombo
-from etterna_graph.util import cache, iter_scores, parsedate
+from etterna_graph.util import SSR_NORM_PERCENT, iter_scores
 
 
 """
@@ -16,36 +23,185 @@ and generate data points out of them. There are multiple data generator
 functions here, one for each plot
 """
 
+# The TapNoteScores judgements that count as notes (i.e. everything except mines)
+_JUDGEMENTS = ("Miss", "W1", "W2", "W3", "W4", "W5")
+# Number of notes judged in a score's TapNoteScores, summed up in one XPath evaluation
+# instead of looking up each judgement by name
+_IS_JUDGEMENT = " or ".join(f"self::{judgement}" for judgement in _JUDGEMENTS)
+_NUM_JUDGED_NOTES = etree.XPath(f"sum(TapNoteScores/*[{_IS_JUDGEMENT}])")
+_HAS_TAP_NOTE_SCORES = etree.XPath("boolean(TapNoteScores)")
+
+# Per-score values, compiled once instead of parsing the path again on every score.
+# number() gives NaN and string() an empty string where the element is missing
+_DATETIME = etree.XPath("string(DateTime)")
+_PLAYED_SECONDS = etree.XPath("number(PlayedSeconds)")
+_SKILLSET_SSRS = etree.XPath("SkillsetSSRs/*/text()")
+_MAX_COMBO = etree.XPath("number(MaxCombo)")
+_OVERALL = etree.XPath("number(SkillsetSSRs/Overall)")
+_MARVELOUSES = etree.XPath("number(TapNoteScores/W1)")
+_PERFECTS = etree.XPath("number(TapNoteScores/W2)")
+_MODIFIERS = etree.XPath("string(Modifiers)")
+# Document-wide values, each computed in a single libxml2 evaluation
+_TOTAL_JUDGEMENTS = etree.XPath("sum(//TapNoteScores/*)")
+_TOTAL_SESSION_SECONDS = etree.XPath("number(GeneralData/TotalSessionSeconds)")
+_TOTAL_GAMEPLAY_SECONDS = etree.XPath("number(GeneralData/TotalGameplaySeconds)")
+_SCORE_ELEMENTS = etree.XPath("//Score")
+_CHART_ELEMENTS = etree.XPath("//Chart")
+
+# These values were gathered through a quick-and-dirty screen recording based test
+_PERSPECTIVE_MOD_MULTIPLIERS = {
+    "Incoming": 1 / 1.2931,
+    "Space": 1 / 1.2414,
+    "Hallway": 1 / 1.2931,
+    "Distant": 1 / 1.2759,
+}
+# The modifiers that change how fast the notes move on screen, e.g. "C700", "Mini", "50%
+# Mini", "Distant" or "50% Distant". The name of the outer group of the alternative that
+# matched ends up in `lastgroup`
+_SPEED_MODIFIER = re.compile(
+    r"(?P<cmod>C(?P<cmod_value>\d+))"
+    r"|(?P<mini>(?:(?P<mini_percentage>[\d.]+)% )?Mini)"
+    r"|(?P<perspective>(?:(?P<perspective_percentage>[\d.]+)% )?"
+    r"(?P<perspective_name>Incoming|Space|Hallway|Distant))"
+)
+
+
+@dataclass(frozen=True)
+class ScoreTable:
+    """
+    The values that most generators need from every score in `iter_scores`, read out of
+    the xml once and stored column-wise in numpy arrays. Row i of every column belongs
+    to `scores[i]`.
+    """
+
+    scores: list[Element]
+    datetimes: np.ndarray  # datetime64[s]
+    wifescores: np.ndarray  # SSRNormPercent, NaN if missing
+    played_seconds: np.ndarray  # NaN if missing
+    # One row of [Overall, Stream, Jumpstream, Handstream, Stamina, JackSpeed,
+    # Chordjack, Technical] per score. All NaN if the score has no SkillsetSSRs
+    skillset_ssrs: np.ndarray
+    num_notes: np.ndarray
+    max_combos: np.ndarray  # NaN if missing
+    packs: np.ndarray  # Pack attribute of the score's chart, object dtype
+    # Index of the first score of every ScoresAt element. The scores are in document
+    # order, so the scores of one ScoresAt are the rows from its start up to the next
+    # one
+    scores_at_starts: np.ndarray
+
+    def __post_init__(self) -> None:
+        # The table is cached and shared by all the generators, so none of them may
+        # modify it
+        for column in vars(self).values():
+            if isinstance(column, np.ndarray):
+                column.flags.writeable = False
+
+
+# The result is cached for the most recently passed XML
+@functools.lru_cache(maxsize=1)
+def score_table(xml: Element) -> ScoreTable:
+    scores = list(iter_scores(xml))
+
+    no_ssrs = [math.nan] * 8
+    skillset_ssrs = []
+    scores_at_starts = []
+    previous_scores_at = None
+    for i, score in enumerate(scores):
+        scores_at = score.getparent()
+        if scores_at is not previous_scores_at:
+            scores_at_starts.append(i)
+            previous_scores_at = scores_at
+
+        ssrs = _SKILLSET_SSRS(score)
+        skillset_ssrs.append(
+            [float(ssr) for ssr in ssrs] if len(ssrs) == 8 else no_ssrs
+        )
+
+    return ScoreTable(
+        scores=scores,
+        datetimes=np.array([_DATETIME(s) for s in scores], dtype="datetime64[s]"),
+        wifescores=np.array([SSR_NORM_PERCENT(s) for s in scores], dtype=np.float64),
+        played_seconds=np.array([_PLAYED_SECONDS(s) for s in scores], dtype=np.float64),
+        skillset_ssrs=np.array(skillset_ssrs, dtype=np.float64).reshape(-1, 8),
+        num_notes=np.array([util.num_notes(s) for s in scores], dtype=np.int64),
+        max_combos=np.array([_MAX_COMBO(s) for s in scores], dtype=np.float64),
+        # Score -> ScoresAt -> Chart
+        packs=np.array(
+            [s.getparent().getparent().get("Pack") for s in scores], dtype=object
+        ),
+        scores_at_starts=np.array(scores_at_starts, dtype=np.int64),
+    )
+
+
+# Every Score and every Chart element in the document. Unlike `score_table`, this
+# includes the scores that `iter_scores` leaves out. The lists are cached for the most
+# recently passed XML, so the generators that need them don't each walk the whole tree
+# again
+@functools.lru_cache(maxsize=1)
+def _all_scores(xml: Element) -> list[Element]:
+    return _SCORE_ELEMENTS(xml)
+
+
+@functools.lru_cache(maxsize=1)
+def _all_charts(xml: Element) -> list[Element]:
+    return _CHART_ELEMENTS(xml)
+
+
+# The DateTime of every score in `_all_scores`, parsed by numpy in one go (NaT if
+# missing)
+@functools.lru_cache(maxsize=1)
+def _all_score_datetimes(xml: Element) -> np.ndarray:
+    return np.array([_DATETIME(s) for s in _all_scores(xml)], dtype="datetime64[s]")
+
+
+# The Overall SSR of every score in `_all_scores`, NaN if missing
+@functools.lru_cache(maxsize=1)
+def _all_score_overalls(xml: Element) -> np.ndarray:
+    return np.array([_OVERALL(s) for s in _all_scores(xml)], dtype=np.float64)
+
+
+# Which of `datetimes` lie within the given timespan before now. Missing datetimes (NaT)
+# count as within the timespan
+def _within_timespan(datetimes: np.ndarray, timespan: timedelta) -> np.ndarray:
+    cutoff = np.datetime64(datetime.now() - timespan, "s")
+    return ~(datetimes < cutoff)
+
+
+# Which of `datetimes` lie within the last `months` months (of 365/12 days each). All of
+# them if `months` is None
+def _within_n_months(datetimes: np.ndarray, months: int | None) -> np.ndarray:
+    if months is None:
+        return np.ones(len(datetimes), dtype=bool)
+    return _within_timespan(datetimes, timedelta(365 / 12 * months))
+
 
 def gen_manip(xml, analysis):
-    x = analysis.datetimes
-    y = [math.log(max(m * 100, 0.01)) / math.log(10) for m in analysis.manipulations]
+    x = analysis.datetimes.tolist()
+    manipulations = np.asarray(analysis.manipulations, dtype=np.float64)
+    y = np.log10(np.maximum(manipulations * 100, 0.01)).tolist()
     ids = analysis.scores
     return ((x, y), ids)
 
 
 def score_to_wifescore(score):
-    overall = score.findtext(".//Overall")
-    overall = float(overall) if overall else 0.0
-    return overall
+    overall = _OVERALL(score)
+    return 0.0 if math.isnan(overall) else overall
 
 
 def score_to_accuracy(score):
-    percent = float(score.findtext("SSRNormPercent")) * 100
+    percent = SSR_NORM_PERCENT(score) * 100
     if percent <= -400:
         return None  # Those are weird
-    if percent > 100:
+    if not percent <= 100:  # also catches NaN, from scores without SSRNormPercent
         return None
-    return -(math.log(100 - percent) / math.log(10))
+    return -math.log10(100 - percent)
 
 
 def score_to_ma(score):
-    tap_note_scores = score.find("TapNoteScores")
-    marvelouses = float(tap_note_scores.findtext("W1"))
-    perfects = float(tap_note_scores.findtext("W2"))
-
-    ma = marvelouses / perfects
-    return math.log(ma) / math.log(10)  # For log scale support
+    ma = _MARVELOUSES(score) / _PERFECTS(score)
+    if math.isnan(ma):
+        return None  # no TapNoteScores
+    return math.log10(ma)  # For log scale support
 
 
 def map_scores(
@@ -54,7 +210,9 @@ def map_scores(
     x, y = [], []
     ids = []
     brushes = []
-    for score in iter_scores(xml):
+    table = score_table(xml)
+    # the datetimes were already parsed into the score table, convert them all in one go
+    for score, dt in zip(table.scores, table.datetimes.tolist()):
         if discard_errors:
             try:
                 value = (mapper)(score, *mapper_args)
@@ -65,14 +223,12 @@ def map_scores(
         if value is None:
             continue
 
-        x.append(parsedate(score.findtext("DateTime")))
+        x.append(dt)
         y.append(value)
         ids.append(score)
         if brush_color_over_10_notes:
-            tap_note_scores = score.find("TapNoteScores")
-            if tap_note_scores:
-                judgements = ["Miss", "W1", "W2", "W3", "W4", "W5"]
-                total_notes = sum(int(tap_note_scores.findtext(x)) for x in judgements)
+            if _HAS_TAP_NOTE_SCORES(score):
+                total_notes = _NUM_JUDGED_NOTES(score)
             else:
                 total_notes = 500  # just assume 100 as a default yolo
 
@@ -96,112 +252,120 @@ def gen_ma(xml):
     return map_scores(xml, score_to_ma)
 
 
-# Returns list of sessions where a session is [(Score, datetime)]
+# Returns the indices that sort the score table chronologically, and the boundaries of
+# the sessions in that order: session i is made up of the sorted scores bounds[i] to
+# bounds[i + 1]
 # A session is defined to end when there's no play in 60 minutes or more
-def divide_into_sessions(xml: Element) -> list[list[tuple[Element, datetime]]]:
-    if sessions := cache("sessions_division_cache"):
-        return sessions
+# The result is cached for the most recently passed XML
+@functools.lru_cache(maxsize=1)
+def _session_bounds(xml: Element) -> tuple[np.ndarray, list[int]]:
+    session_end_threshold = np.timedelta64(1, "h")
+
+    datetimes = score_table(xml).datetimes
+    order = np.argsort(datetimes, kind="stable")
+
+    # a new session starts after every gap between two chronologically consecutive
+    # scores that's too long
+    session_starts = (
+        np.flatnonzero(np.diff(datetimes[order]) > session_end_threshold) + 1
+    )
+    bounds = [0, *session_starts.tolist(), len(order)] if len(order) > 0 else []
+    return order, bounds
 
-    session_end_threshold = timedelta(hours=1)
 
-    scores = list(iter_scores(xml))
-    datetimes = [parsedate(s.find("DateTime").text) for s in scores]
-    zipped = zip(scores, datetimes)
-    zipped = sorted(zipped, key=lambda pair: pair[1])
-
-    # zipped is a list of chronologically sorted (score object, datetime) tuples
-
-    prev_score_datetime = zipped[0][1]  # first datetime
-    current_session = [
-        zipped[0]
-    ]  # list of (score object, datetime) tuples in current session
-    sessions: list[list[tuple[Element, datetime]]] = (
-        []
-    )  # list of sessions where every session is like `current_session`
-    for score, score_datetime in zipped[1:]:
-        score_interval = score_datetime - prev_score_datetime
-        # check if timedelta between two scores is too high
-        if score_interval > session_end_threshold:
-            sessions.append(current_session)
-            current_session = []
-        current_session.append((score, score_datetime))
-        prev_score_datetime = score_datetime
-    sessions.append(current_session)
-    _ = cache("sessions_division_cache", sessions)
-
-    return sessions
+# The datetimes of the first and of the last play of every session, in session order
+def _session_start_end_datetimes(xml: Element) -> tuple[np.ndarray, np.ndarray]:
+    order, bounds = _session_bounds(xml)
+    datetimes = score_table(xml).datetimes[order]
+    starts = datetimes[np.array(bounds[:-1], dtype=np.int64)]
+    ends = datetimes[np.array(bounds[1:], dtype=np.int64) - 1]
+    return starts, ends
+
+
+# Returns list of sessions where a session is [(Score, datetime)]
+# The result is cached for the most recently passed XML
+@functools.lru_cache(maxsize=1)
+def divide_into_sessions(xml: Element) -> list[list[tuple[Element, datetime]]]:
+    table = score_table(xml)
+    order, bounds = _session_bounds(xml)
+
+    # chronologically sorted (score object, datetime) tuples
+    pairs = list(
+        zip([table.scores[i] for i in order.tolist()], table.datetimes[order].tolist())
+    )
+    return [pairs[start:end] for start, end in zip(bounds, bounds[1:])]
 
 
 def gen_wifescore_frequencies(xml: Element) -> tuple[list[int], list[int]]:
     # e.g. the 0.70 bucket corresponds to all scores between 0.70 and 0.71 (not 0.695 and 0.705!)
-    frequencies = {percent: 0 for percent in range(70, 100)}
+    wifescores = score_table(xml).wifescores
+    percents = np.round(wifescores[~np.isnan(wifescores)] * 100)
+    # scores outside of the buckets are left out, not clipped into the outermost ones
+    percents = percents[(percents >= 70) & (percents < 100)].astype(np.int64)
+
+    frequencies = np.bincount(percents - 70, minlength=30)
+    return list(range(70, 100)), frequencies.tolist()
+
 
-    for score in iter_scores(xml):
-        if ssr_norm_percent := score.findtext("SSRNormPercent"):
-            wifescore = float(ssr_norm_percent)
-            percent = round(wifescore * 100)
-            if percent in frequencies:
-                frequencies[percent] += 1
-    return list(frequencies.keys()), list(frequencies.values())
+# The Sunday of the given week, with weeks counted like strptime's %W does: week 1
+# starts on the first Monday of the year
+def _sunday_of_week(year: int, week: int) -> datetime:
+    new_year = datetime(year, 1, 1)
+    first_monday = new_year + timedelta(days=(7 - new_year.weekday()) % 7)
+    return first_monday + timedelta(weeks=week - 1, days=6)
 
 
 # Return format: [[a,a...],[b,b...],[c,c...],[d,d...],[e,e...],[f,f...],[g,g...]]
 def gen_week_skillsets(xml: Element) -> tuple[list[datetime], list[List[float]]]:
-    # returns an integer week from 0-51
-    def week_from_score(score: Element) -> int:
-        datetime = parsedate(score.findtext("DateTime"))
-        week = datetime.isocalendar()[1]
-        return week
-
-    chronological_scores = sorted(
-        iter_scores(xml), key=lambda s: s.findtext("DateTime")
+    table = score_table(xml)
+    order = np.argsort(table.datetimes, kind="stable")
+    datetimes = table.datetimes[order].tolist()
+    skillset_ssrs = table.skillset_ssrs[order]
+
+    # Consecutive scores with the same ISO week number (1-53) form a group
+    weeks = np.array([dt.isocalendar()[1] for dt in datetimes], dtype=np.int64)
+    group_starts = np.flatnonzero(np.diff(weeks) != 0) + 1
+    group_indices = np.zeros(len(weeks), dtype=np.int64)
+    group_indices[group_starts] = 1
+    np.cumsum(group_indices, out=group_indices)
+    group_starts = [0, *group_starts.tolist()] if len(weeks) > 0 else []
+
+    # count how often each skillset is the main one (the first of the highest) per group
+    has_ssrs = ~np.isnan(skillset_ssrs[:, 0])
+    diffsets = np.zeros((len(group_starts), 7))
+    np.add.at(
+        diffsets,
+        (group_indices[has_ssrs], skillset_ssrs[has_ssrs, 1:].argmax(axis=1)),
+        1,
     )
 
+    totals = diffsets.sum(axis=1)
     week_start_datetimes: List[datetime] = []
-    diffsets: List[List[float]] = []
-
-    for week, scores_in_week in util.groupby(chronological_scores, week_from_score):
-        diffset = [0, 0, 0, 0, 0, 0, 0]
-        for score in scores_in_week:
-            skillset_ssrs = score.find("SkillsetSSRs")
-            if skillset_ssrs is None:
-                continue
-            diffs = [float(diff.text) for diff in skillset_ssrs[1:]]
-            main_diff = diffs.index(max(diffs))
-            diffset[main_diff] += 1
-
-        total = sum(diffset)
-        if total == 0:
-            continue
-        diffset = [diff / total * 100 for diff in diffset]
-
-        year = scores_in_week[0].findtext("DateTime")[:4]
-        week_start_datetime = datetime.strptime(f"{year} {week} {0}", "%Y %W %w")
-
-        diffsets.append(diffset)
-        week_start_datetimes.append(week_start_datetime)
+    for group_i in np.flatnonzero(totals > 0).tolist():
+        first_datetime = datetimes[group_starts[group_i]]
+        week = int(weeks[group_starts[group_i]])
+        week_start_datetimes.append(_sunday_of_week(first_datetime.year, week))
+    diffsets = diffsets[totals > 0] / totals[totals > 0, np.newaxis] * 100
 
-    return (week_start_datetimes, diffsets)
+    return (week_start_datetimes, diffsets.tolist())
 
 
 def gen_plays_by_hour(xml: Element) -> tuple[list[int], list[int]]:
-    num_plays = [0] * 24
-    for score in iter_scores(xml):
-        datetime = parsedate(score.find("DateTime").text)
-        num_plays[datetime.hour] += 1
+    datetimes = score_table(xml).datetimes
+    hours = (datetimes - datetimes.astype("datetime64[D]")).astype("timedelta64[h]")
+    num_plays = np.bincount(hours.astype(np.int64), minlength=24)
 
     # I tried to use a datetime as key (would be nicer to display), but
     # it doesn't play nicely with matplotlib, so we need to use an
     # integer to represent the hour of the day.
     # return {time(hour=i): num_plays[i] for i in range(24)}
-    return list(range(24)), num_plays
+    return list(range(24)), num_plays.tolist()
 
 
 def gen_most_played_charts(xml: Element, num_charts: int) -> list[tuple[Element, int]]:
     charts_num_plays: list[tuple[Element, int]] = []
-    for chart in xml.iter("Chart"):
-        score_filter = lambda s: float(s.findtext("SSRNormPercent")) > 0.5
-        num_plays = len([s for s in iter_scores(chart) if score_filter(s)])
+    for chart in _all_charts(xml):
+        num_plays = sum(1 for s in iter_scores(chart) if SSR_NORM_PERCENT(s) > 0.5)
         if num_plays > 0:
             charts_num_plays.append((chart, num_plays))
 
@@ -210,53 +374,47 @@ def gen_most_played_charts(xml: Element, num_charts: int) -> list[tuple[Element,
 
 
 def gen_hours_per_skillset(xml: Element):
-    hours = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+    table = score_table(xml)
+    has_ssrs = ~np.isnan(table.skillset_ssrs[:, 0])
+    # the first of the highest skillsets is a score's main skillset
+    main_skillsets = table.skillset_ssrs[has_ssrs, 1:].argmax(axis=1)
 
-    for score in iter_scores(xml):
-        skillset_ssrs = score.find("SkillsetSSRs")
-        if skillset_ssrs is None:
-            continue
-        diffs = [float(diff.text) for diff in skillset_ssrs[1:]]
-        main_diff = diffs.index(max(diffs))
+    hours = np.bincount(
+        main_skillsets, weights=table.played_seconds[has_ssrs] / 3600, minlength=7
+    )
+    return hours.astype(np.float64).tolist()  # without any scores, bincount gives ints
 
-        length_hours = float(score.findtext("PlayedSeconds")) / 3600
-        hours[main_diff] += length_hours
 
-    return hours
+# Splits the time from the first play onwards into consecutive weeks. Returns the start
+# datetime of every week up to the last play, and the index of the week each of
+# `datetimes` falls into
+def _weeks(datetimes: np.ndarray) -> tuple[list[datetime], np.ndarray]:
+    if len(datetimes) == 0:
+        return [], np.array([], dtype=np.int64)
+    week = np.timedelta64(7, "D")
+    first = datetimes.min()
+    week_indices = ((datetimes - first) // week).astype(np.int64)
+    week_starts = first + np.arange(week_indices.max() + 1) * week
+    return week_starts.tolist(), week_indices
 
 
 def gen_hours_per_week(xml: Element) -> tuple[list[datetime], list[int | float]]:
-    scores = iter_scores(xml)
-    pairs = [(s, parsedate(s.findtext("DateTime"))) for s in scores]  # (score, date)
-    pairs.sort(key=lambda pair: pair[1])  # Sort by datetime
-
-    weeks: dict[datetime, int | float] = {}
-    week_end = pairs[0][1]  # First (earliest) datetime
-    week_start = week_end - timedelta(weeks=1)
-    i = 0
-    while i < len(pairs):
-        score, dt = pairs[i][0], pairs[i][1]
-        if dt < week_end:
-            score_seconds = float(score.findtext("PlayedSeconds")) or 0
-            weeks[week_start] += score_seconds / 3600
-            i += 1
-        else:
-            week_start += timedelta(weeks=1)
-            week_end += timedelta(weeks=1)
-            weeks[week_start] = 0
-
-    return (list(weeks.keys()), list(weeks.values()))
+    table = score_table(xml)
+    week_starts, week_indices = _weeks(table.datetimes)
+    hours = np.bincount(
+        week_indices, weights=table.played_seconds / 3600, minlength=len(week_starts)
+    )
+    return (week_starts, hours.tolist())
 
 
 def calc_average_hours_per_day(xml: Element, timespan: timedelta | None = None):
     timespan = timespan if timespan else timedelta(days=365 / 2)
-    scores: Element = sorted(iter_scores(xml), key=lambda s: s.findtext("DateTime"))
+    table = score_table(xml)
 
-    total_hours = 0
-    for score in scores:
-        total_hours += float(score.findtext("PlayedSeconds")) / 3600
+    recent = _within_timespan(table.datetimes, timespan)
+    total_hours = table.played_seconds[recent].sum() / 3600
 
-    return total_hours / timespan.days
+    return float(total_hours / timespan.days)
 
 
 # OPTIONAL PLOTS BEGINNING
@@ -269,67 +427,39 @@ def gen_hit_distribution_sub_93(xml: Element, analysis):
 
 def gen_idle_time_buckets(xml: Element) -> tuple[range, list[int]]:
     # Each bucket is 5 seconds. Total 10 minutes is tracked
-    buckets = [0] * 600
-
-    a, b = 0, 0
+    num_buckets = 600
 
-    scores: list[tuple[Element, float]] = []
-    for scoresat in xml.iter("ScoresAt"):
-        rate = (
-            float(rate_str) if (rate_str := scoresat.get("Rate")) is not None else 0.0
-        )
-        score_tuples: list[tuple[Element, float]] = []
-        for score in scoresat.iter("Score"):
-            if (skillset_ssrs := score.find("SkillsetSSRs")) is not None:
-                overall_ssr = float(skillset_ssrs.findtext("Overall"))
-                if overall_ssr > 40:
-                    continue
-            if score.findtext("EtternaValid") == "0" and app.app.prefs.hide_invalidated:
-                continue
-            score_tuples.append((score, rate))
-
-        scores.extend(score_tuples)
+    table = score_table(xml)
+    rates = np.array(
+        [float(score.getparent().get("Rate", 0.0)) for score in table.scores],
+        dtype=np.float64,
+    )
 
     # Sort scores by datetime, oldest first
-    scores.sort(key=lambda pair: pair[0].findtext("DateTime"))
-
-    last_play_end = None
-    for score, rate in scores:
-        a += 1
-        datetime = util.parsedate(score.findtext("DateTime"))
-        survive_seconds = float(score.findtext("PlayedSeconds"))
-        # print(survive_seconds, rate)
-        length = timedelta(seconds=survive_seconds * rate)
-
-        # print("Datetime:", datetime)
-        # print("Play length:", str(length)[:-7], "(according to PlayedSeconds)")
-        if last_play_end is not None:
-            idle_time = datetime - last_play_end
-            if idle_time >= timedelta():
-                bucket_index = int(idle_time.total_seconds() // 5)
-                if bucket_index < len(buckets):
-                    buckets[bucket_index] += 1
-            else:
-                # print("Negative idle time!")
-                b += 1
+    order = np.argsort(table.datetimes, kind="stable")
+    # Everything in microseconds, the resolution timedeltas have
+    starts = table.datetimes[order].astype("datetime64[us]").astype(np.int64)
+    lengths = np.round(table.played_seconds[order] * rates[order] * 1e6).astype(
+        np.int64
+    )
+    ends = starts + lengths
 
-        last_play_end = datetime + length
-        # print("Finished", last_play_end)
-        # print()
+    # time between the end of each play and the start of the next one. Plays that start
+    # before the previous one ended are skipped
+    idle_times = starts[1:] - ends[:-1]
+    bucket_indices = idle_times[idle_times >= 0] // 5_000_000
+    bucket_indices = bucket_indices[bucket_indices < num_buckets]
+    buckets = np.bincount(bucket_indices, minlength=num_buckets)
 
     # ~ keys = [i * 5 for i in range(len(buckets))]
-    keys = range(len(buckets))
-    return (keys, buckets)
+    keys = range(num_buckets)
+    return (keys, buckets.tolist())
 
 
 def gen_session_length(xml):
-    sessions = divide_into_sessions(xml)
-    x, y = [], []
-    for s in sessions:
-        x.append(s[0][1])  # Datetime [1] of first play [0] in session
-        y.append((s[-1][1] - s[0][1]).total_seconds() / 60)  # Length in minutes
-
-    return (x, y)
+    starts, ends = _session_start_end_datetimes(xml)
+    lengths = (ends - starts) / np.timedelta64(1, "m")  # Length in minutes
+    return (starts.tolist(), lengths.tolist())
 
 
 def gen_session_plays(xml):
@@ -355,63 +485,39 @@ def gen_session_plays(xml):
 
 
 def gen_plays_per_week(xml: Element):
-    datetimes = [parsedate(s.findtext("DateTime")) for s in iter_scores(xml)]
-    datetimes.sort()
-
-    weeks: dict[datetime, int] = {}
-    week_end = datetimes[0]
-    week_start = week_end - timedelta(weeks=1)
-    i = 0
-    while i < len(datetimes):
-        if datetimes[i] < week_end:
-            weeks[week_start] += 1
-            i += 1
-        else:
-            week_start += timedelta(weeks=1)
-            week_end += timedelta(weeks=1)
-            weeks[week_start] = 0
-
-    return (list(weeks.keys()), list(weeks.values()))
+    week_starts, week_indices = _weeks(score_table(xml).datetimes)
+    num_plays = np.bincount(week_indices, minlength=len(week_starts))
+    return (week_starts, num_plays.tolist())
 
 
 # OPTIONAL PLOTS END
 
 
 def gen_scores_per_hour(xml):
-    hours_of_day = []
-    overalls = []
-    ids = []
-    for score in xml.iter("Score"):
-        skillset_ssrs = score.find("SkillsetSSRs")
-        if not skillset_ssrs:
-            continue
-        overalls.append(float(skillset_ssrs.findtext("Overall")))
+    overalls = _all_score_overalls(xml)
+    has_overall = ~np.isnan(overalls)
+    datetimes = _all_score_datetimes(xml)[has_overall]
 
-        dt = parsedate(score.findtext("DateTime"))
-        midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
-        hour_of_day = (dt - midnight).total_seconds() / 3600
-        hours_of_day.append(hour_of_day)
+    midnights = datetimes.astype("datetime64[D]")
+    hours_of_day = (datetimes - midnights) / np.timedelta64(1, "h")
 
-        ids.append(score)
-
-    return (hours_of_day, overalls), ids
+    ids = [s for s, keep in zip(_all_scores(xml), has_overall.tolist()) if keep]
+    return (hours_of_day.tolist(), overalls[has_overall].tolist()), ids
 
 
 def gen_avg_score_per_hour(xml):
-    nums_scores = [0.0] * 24
-    score_sums = [0.0] * 24
-    for score in xml.iter("Score"):
-        skillset_ssrs = score.find("SkillsetSSRs")
-        if not skillset_ssrs:
-            continue
+    overalls = _all_score_overalls(xml)
+    has_overall = ~np.isnan(overalls)
+    datetimes = _all_score_datetimes(xml)[has_overall]
 
-        hour = parsedate(score.findtext("DateTime")).hour
-        nums_scores[hour] += 1
-
-        score_sums[hour] += float(skillset_ssrs.findtext("Overall"))
+    hours = (datetimes - datetimes.astype("datetime64[D]")) // np.timedelta64(1, "h")
+    nums_scores = np.bincount(hours, minlength=24)
+    score_sums = np.bincount(hours, weights=overalls[has_overall], minlength=24)
 
     x, y = [], []
-    for i, (num_scores, score_sum) in enumerate(zip(nums_scores, score_sums)):
+    for i, (num_scores, score_sum) in enumerate(
+        zip(nums_scores.tolist(), score_sums.tolist())
+    ):
         x.append(i)
         try:
             y.append(score_sum / num_scores)
@@ -421,36 +527,28 @@ def gen_avg_score_per_hour(xml):
 
 
 # the Python wrapping adds about +30% execution time
+# The result is cached for the most recently passed XML
+@functools.lru_cache(maxsize=1)
 def calc_ratings_for_sessions(
     xml: Element,
 ) -> list[tuple[list[tuple[Element, datetime]], list[float], list[float]]]:
-    if ratings_for_sessions := cache("calc_ratings_for_sessions"):
-        return ratings_for_sessions
-
     from etterna_graph.savegame_analysis import SkillTimeline
 
-    sessions: list[list[tuple[Element, datetime]]] = []
-    session_ids: list[int] = []
-    # Each row is a session, column being a SSR category.
-    ssr_lists: list[list[float]] = [[], [], [], [], [], [], []]
-    for session_i, session in enumerate(divide_into_sessions(xml)):
-        session_has_been_added = False
-
-        for score, _ in session:
-            player_skillsets = score.find("SkillsetSSRs")
-            if player_skillsets is None:
-                continue
-
-            if not session_has_been_added:
-                session_has_been_added = True
-                sessions.append(session)
-
-            session_ids.append(session_i)
-
-            for i in range(7):
-                if (value_str := player_skillsets[i + 1].text) is not None:
-                    value = float(value_str)
-                    ssr_lists[i].append(value)
+    all_sessions = divide_into_sessions(xml)
+    order, bounds = _session_bounds(xml)
+    # the chronologically sorted skillset SSRs, and the session each of those scores is
+    # in
+    skillset_ssrs = score_table(xml).skillset_ssrs[order]
+    session_indices = np.repeat(np.arange(len(all_sessions)), np.diff(bounds))
+
+    # Only scores with SSRs are rated, and only sessions with at least one of those are
+    # kept
+    has_ssrs = ~np.isnan(skillset_ssrs[:, 0])
+    session_ids: list[int] = session_indices[has_ssrs].tolist()
+    sessions = [all_sessions[i] for i in np.unique(session_indices[has_ssrs]).tolist()]
+    # Each row is a SSR category, column being a score. Converted in one go from the
+    # contiguous array, instead of appending every value to its list one by one
+    ssr_lists: list[list[float]] = skillset_ssrs[has_ssrs, 1:].T.tolist()
 
     timeline = SkillTimeline(ssr_lists, session_ids)
 
@@ -486,8 +584,6 @@ def calc_ratings_for_sessions(
     #   (<session>, [25, 17, 41, 23, 25, 26, 12]),
     #   (<session>, [25, 25, 26, 12, 17, 41, 23]),
     # ]
-    _ = cache("calc_agg_ratings_for_sessions", agg_session_rating_pairs)
-    _ = cache("calc_indiv_ratings_for_sessions", indiv_session_rating_pairs)
 
     session_ratings = [
         (a[0], a[1], b[1])
@@ -523,55 +619,41 @@ def gen_session_rating_improvement(xml: Element):
 
 # Returns tuple of `(max_combo_chart_element, max_combo_int)`
 def find_longest_combo(xml: Element) -> tuple[Element | None, int]:
-    max_combo_chart = None
-    max_combo = 0
-    for chart in xml.iter("Chart"):
-        for score in iter_scores(chart):
-            if (max_combo_str := score.findtext("MaxCombo")) is not None:
-                combo = int(max_combo_str)
-                if combo > max_combo:
-                    max_combo = combo
-                    max_combo_chart = chart
-    return max_combo_chart, max_combo
+    table = score_table(xml)
+    if not np.nanmax(table.max_combos, initial=0) > 0:
+        return None, 0
+    # the first score with the longest combo, like the scan over all charts found
+    i = int(np.nanargmax(table.max_combos))
+    return util.find_parent_chart(xml, table.scores[i]), int(table.max_combos[i])
 
 
 # Returns dict with pack names as keys and the respective "pack liking"
 # as value. The liking value is currently simply the amount of plays in the pack
 def generate_pack_likings(xml: Element, months: int | None) -> dict[str, int]:
-    likings: dict[str, int] = {}
-    for chart in xml.iter("Chart"):
-        num_relevant_plays = 0
-        for score in iter_scores(chart):
-            if util.score_within_n_months(score, months):
-                num_relevant_plays += 1
-        pack = chart.get("Pack")
+    table = score_table(xml)
+    # every named pack is listed, even if none of its scores are recent enough
+    likings = {pack: 0 for chart in _all_charts(xml) if (pack := chart.get("Pack"))}
 
-        if pack not in likings and pack:
-            likings[pack] = 0
-        elif pack in likings:
-            likings[pack] += num_relevant_plays
+    recent_packs = table.packs[_within_n_months(table.datetimes, months)]
+    for pack, num_plays in Counter(recent_packs.tolist()).items():
+        if pack:
+            likings[pack] += num_plays
 
     return likings
 
 
 def calculate_total_wifescore(xml: Element, months: int = 6) -> float:
-    weighted_sum = 0
-    num_notes_sum = 0
-    for score in iter_scores(xml):
-        if not util.score_within_n_months(score, months):
-            continue
+    table = score_table(xml)
+    recent = _within_n_months(table.datetimes, months)
 
-        num_notes = util.num_notes(score)
-        num_notes_sum += util.num_notes(score)
+    num_notes = table.num_notes[recent]
+    # scores without an SSRNormPercent still count towards the number of notes
+    weighted_sum = np.nansum(table.wifescores[recent] * num_notes)
+    num_notes_sum = num_notes.sum()
 
-        if (ssr_norm_percent := score.findtext("SSRNormPercent")) is not None:
-            wifescore = float(ssr_norm_percent)
-            weighted_sum += wifescore * num_notes
-
-    try:
-        return weighted_sum / num_notes_sum
-    except ZeroDivisionError:
+    if num_notes_sum == 0:
         return 0
+    return float(weighted_sum / num_notes_sum)
 
 
 def gen_skillset_development(
@@ -589,52 +671,34 @@ def gen_skillset_development(
 
 
 def gen_cmod_over_time(xml: Element):
-    # These values were gathered through a quick-and-dirty screen recording based test
-    perspective_mod_multipliers = {
-        "Incoming": 1 / 1.2931,
-        "Space": 1 / 1.2414,
-        "Hallway": 1 / 1.2931,
-        "Distant": 1 / 1.2759,
-    }
-
     datetime_cmod_map = {}
-    for score in xml.iter("Score"):
-        modifiers = score.findtext("Modifiers").split(", ")
+    for score, dt in zip(_all_scores(xml), _all_score_datetimes(xml).tolist()):
+        modifiers = _MODIFIERS(score).split(", ")
         cmod = None
         receptor_size = None
         perspective_mod_multiplier = 1
         for modifier in modifiers:
-            if cmod is None and modifier.startswith("C") and modifier[1:].isdecimal():
-                try:
-                    cmod = float(modifier[1:])
-                except ValueError:
-                    print("huh a weird cmod:", modifier)
-                    continue
-            elif receptor_size is None and modifier.endswith("Mini"):
-                mini_percentage_string = modifier[:-4]
-                if mini_percentage_string == "":
-                    receptor_size = 0.5
-                else:
-                    if not mini_percentage_string.endswith("% "):
-                        continue  # false positive
-                    mini = float(mini_percentage_string[:-2]) / 100
-                    receptor_size = 1 - mini / 2
-            elif any(
-                persp_mod in modifier
-                for persp_mod in perspective_mod_multipliers.keys()
-            ):
-                # modifier can either be something like "Distant" or "50% Distant"
-                tokens = modifier.split(" ")
-                if len(tokens) == 1:
-                    perspective_mod_multiplier = perspective_mod_multipliers[tokens[0]]
-                elif len(tokens) == 2:
-                    perspective_mod_multiplier = perspective_mod_multipliers[tokens[1]]
-
+            match = _SPEED_MODIFIER.fullmatch(modifier)
+            if match is None:
+                continue
+            if match.lastgroup == "cmod":
+                if cmod is None:
+                    cmod = float(match["cmod_value"])
+            elif match.lastgroup == "mini":
+                if receptor_size is None:
+                    if match["mini_percentage"] is None:
+                        receptor_size = 0.5
+                    else:
+                        mini = float(match["mini_percentage"]) / 100
+                        receptor_size = 1 - mini / 2
+            else:
+                perspective_mod_multiplier = _PERSPECTIVE_MOD_MULTIPLIERS[
+                    match["perspective_name"]
+                ]
+                if match["perspective_percentage"] is not None:
                     # factor in the "50%" (or whichever number it is)
-                    perspective_strength = float(tokens[0][:-1]) / 100
+                    perspective_strength = float(match["perspective_percentage"]) / 100
                     perspective_mod_multiplier **= perspective_strength
-                else:
-                    print(f"uhh this shouldn't happen? '{modifier}'")
         if receptor_size is None:
             receptor_size = 1
 
@@ -644,8 +708,6 @@ def gen_cmod_over_time(xml: Element):
             continue  # player's using xmod or something
 
         effective_cmod = cmod * receptor_size * perspective_mod_multiplier
-
-        dt = parsedate(score.findtext("DateTime"))
         datetime_cmod_map[dt] = effective_cmod
 
     datetimes = list(sorted(datetime_cmod_map.keys()))
@@ -654,12 +716,22 @@ def gen_cmod_over_time(xml: Element):
 
 
 def count_nums_grades(xml):
-    grades = []
-    for score in util.iter_scores(xml):
-        percent = float(score.findtext("SSRNormPercent"))
-        grade = sum(percent >= t for t in util.GRADE_THRESHOLDS) - 1
-        grades.append(util.GRADE_NAMES[grade])
-    return Counter(grades)
+    wifescores = score_table(xml).wifescores
+    # like util.wifescore_to_grade_string, for all scores at once
+    grade_indices = (
+        np.searchsorted(
+            util.GRADE_THRESHOLDS, wifescores[~np.isnan(wifescores)], side="right"
+        )
+        - 1
+    )
+    nums_grades = np.bincount(grade_indices, minlength=len(util.GRADE_NAMES))
+    return Counter(
+        {
+            grade: num
+            for grade, num in zip(util.GRADE_NAMES, nums_grades.tolist())
+            if num > 0
+        }
+    )
 
 
 def gen_text_most_played_charts(xml: Element, limit: int = 5):
@@ -688,20 +760,22 @@ def gen_text_most_played_charts(xml: Element, limit: int = 5):
 
 def gen_text_longest_sessions(xml, limit=5):
     sessions = divide_into_sessions(xml)
-    new_sessions = []  # like `sessions`, but with total gameplay seconds annotated
-    for session in sessions:
-        total_gameplay_seconds = sum(
-            float(score[0].findtext("PlayedSeconds")) for score in session
-        )
-        new_sessions.append((session, total_gameplay_seconds))
-    sessions = new_sessions
-    sessions.sort(key=lambda pair: pair[1], reverse=True)  # Sort by length
+    order, bounds = _session_bounds(xml)
+    # total gameplay seconds of every session, all summed up in one go
+    played_seconds = score_table(xml).played_seconds[order]
+    gameplay_seconds_per_session = (
+        np.add.reduceat(played_seconds, bounds[:-1]) if sessions else played_seconds
+    )
+    # Sort by length. Stable, so that equally long sessions stay in chronological order
+    longest_first = np.argsort(-gameplay_seconds_per_session, kind="stable")
 
     num_not_shown = 0
     num_shown = 0
     text = ["Longest sessions:"]
     i = 1
-    for session, gameplay_seconds in sessions:
+    for session_i in longest_first.tolist():
+        session = sessions[session_i]
+        gameplay_seconds = gameplay_seconds_per_session[session_i]
         num_plays = len(session)
 
         if num_plays < app.app.prefs.msgbox_num_scores_threshold:
@@ -748,15 +822,13 @@ def gen_text_skillset_hours(xml):
 def gen_text_general_info(xml, r):
     from dateutil.relativedelta import relativedelta
 
-    total_notes = 0
-    for tap_note_scores in xml.iter("TapNoteScores"):
-        total_notes += sum(int(e.text) for e in tap_note_scores)
+    total_notes = int(_TOTAL_JUDGEMENTS(xml))
     total_notes_string = util.abbreviate(total_notes, min_precision=3)
 
-    scores = list(iter_scores(xml))
-    num_charts = len(list(xml.iter("Chart")))
-    hours = sum(float(s.findtext("PlayedSeconds")) / 3600 for s in scores)
-    first_play_date = min([parsedate(s.findtext("DateTime")) for s in scores])
+    table = score_table(xml)
+    num_charts = len(_all_charts(xml))
+    hours = table.played_seconds.sum() / 3600
+    first_play_date = table.datetimes.min().item()
     duration = relativedelta(datetime.now(), first_play_date)
 
     grades = count_nums_grades(xml)
@@ -767,30 +839,28 @@ def gen_text_general_info(xml, r):
     )
     grade_names = list(reversed(util.GRADE_NAMES))
 
-    best_aaa = (None, 0)
-    best_aaaa = (None, 0)
-    for score in iter_scores(xml):
-        wifescore = float(score.findtext("SSRNormPercent"))
-        skillset_ssrs = score.find("SkillsetSSRs")
-        if skillset_ssrs is None:
-            continue
-        overall = float(skillset_ssrs.findtext("Overall"))
-
-        if wifescore < util.AAA_THRESHOLD:
-            pass  # we don't care about sub-AAA scores
-        elif wifescore < util.AAAA_THRESHOLD:
-            if overall > best_aaa[1]:
-                best_aaa = (score, overall)
-        else:
-            if overall > best_aaaa[1]:
-                best_aaaa = (score, overall)
+    # The first score with the highest overall among those where `mask` is set
+    def best_score(mask: np.ndarray) -> tuple[Element | None, float]:
+        overalls = table.skillset_ssrs[:, 0]
+        overalls = np.where(mask & ~np.isnan(overalls), overalls, -np.inf)
+        if len(overalls) == 0 or not overalls.max() > 0:
+            return (None, 0)
+        i = int(overalls.argmax())
+        return (table.scores[i], float(overalls[i]))
+
+    # we don't care about sub-AAA scores
+    wifescores = table.wifescores
+    best_aaa = best_score(
+        (wifescores >= util.AAA_THRESHOLD) & (wifescores < util.AAAA_THRESHOLD)
+    )
+    best_aaaa = best_score(wifescores >= util.AAAA_THRESHOLD)
 
     def get_score_desc(score, overall) -> str:
         if score is None:
             return "[none]"
         chart = util.find_parent_chart(xml, score)
-        dt = score.findtext("DateTime")
-        wifescore = float(score.findtext("SSRNormPercent"))
+        dt = _DATETIME(score)
+        wifescore = SSR_NORM_PERCENT(score)
         pack = chart.get("Pack")
         song = chart.get("Song")
         return f'{overall:.2f}, {wifescore*100:.2f}% - "{song}" ({pack}) - {dt[:10]}'
@@ -799,7 +869,7 @@ def gen_text_general_info(xml, r):
         [
             f"You started playing {duration.years} years {duration.months} months ago",
             f"Total hours spent playing: {round(hours)} hours",
-            f"Number of scores: {len(scores)}",
+            f"Number of scores: {len(table.scores)}",
             f"Number of unique files played: {num_charts}",
             f"Grades: {grades_string}",
             # ~ f"Grades: {grades_string_1}",
@@ -812,10 +882,13 @@ def gen_text_general_info(xml, r):
 
 
 # a stands for ReplaysAnalysis
+# The result is cached for the most recently passed XML and replays analysis. Loading
+# another Etterna.xml gives a new root element, so it's recomputed then
+@functools.lru_cache(maxsize=1)
 def gen_text_general_analysis_info(xml: Element, a: ReplaysAnalysis | None) -> str:
     long_mcombo_str = "[please load replay data]"
     if a:  # If ReplaysAnalysis is avilable
-        if chart := a.longest_mcombo[1]:
+        if (chart := a.longest_mcombo[1]) is not None:
             long_mcombo_chart = f'"{chart.get("Song")}" ({chart.get("Pack")})'
             long_mcombo_str = f"{a.longest_mcombo[0]} on {long_mcombo_chart}"
 
@@ -865,7 +938,7 @@ def gen_text_general_analysis_info(xml: Element, a: ReplaysAnalysis | None) -> s
             song = chart.get("Song")
             old = a.current_wifescores[index]
             new = a.new_wifescores[index]
-            dt = score.findtext("DateTime")[:10]
+            dt = _DATETIME(score)[:10]
             return f"{old*100:.2f}%, {new*100:.2f}% without unfair cb rush - {song} ({pack}) {dt}"
 
         worst_cb_rush_string = (
@@ -879,8 +952,8 @@ def gen_text_general_analysis_info(xml: Element, a: ReplaysAnalysis | None) -> s
         sd_string = "[please load replay data]"
         worst_cb_rush_string = "[please load replay data]"
 
-    session_secs = int(xml.find("GeneralData").findtext("TotalSessionSeconds"))
-    play_secs = int(xml.find("GeneralData").findtext("TotalGameplaySeconds"))
+    session_secs = int(_TOTAL_SESSION_SECONDS(xml))
+    play_secs = int(_TOTAL_GAMEPLAY_SECONDS(xml))
     if session_secs == 0:  # Happened for BanglesOtter, for whatever reason
         play_percentage = 0
     else:
@@ -892,8 +965,10 @@ def gen_text_general_analysis_info(xml: Element, a: ReplaysAnalysis | None) -> s
     average_hours_str = util.timespan_str(average_hours)
 
     session_date_threshold = datetime.now() - timedelta(days=7)
-    sessions = divide_into_sessions(xml)
-    num_sessions = len([s for s in sessions if s[0][1] > session_date_threshold])
+    session_starts, _ = _session_start_end_datetimes(xml)
+    num_sessions = int(
+        np.count_nonzero(session_starts > np.datetime64(session_date_threshold))
+    )
 
     total_wifescore = calculate_total_wifescore(xml, months=6)
     total_wifescore_str = f"{round(total_wifescore * 100, 2)}%"
@@ -906,8 +981,8 @@ def gen_text_general_analysis_info(xml: Element, a: ReplaysAnalysis | None) -> s
         chart = util.find_parent_chart(xml, cmb.score)
         pack = chart.get("Pack")
         song = chart.get("Song")
-        wifescore = float(cmb.score.findtext("SSRNormPercent"))
-        dt = cmb.score.findtext("DateTime")
+        wifescore = SSR_NORM_PERCENT(cmb.score)
+        dt = _DATETIME(cmb.score)
 
         return (
             f"NPS={cmb.speed:.2f} ({cmb.length} notes, from "
@@ -915,39 +990,44 @@ def gen_text_general_analysis_info(xml: Element, a: ReplaysAnalysis | None) -> s
             f"({pack}), {wifescore*100:.2f}%"
         )
 
-    return "<br>".join(
-        [
-            f"You spend {play_percentage}% of your sessions in gameplay",
-            f"Total CB percentage per column (left to right): {cbs_string}",
-            f"Median score increase when immediately replaying a chart: {median_score_increase}%",
-            f"Mean hit offset: {mean_string}",
-            f"Overall standard deviation: {sd_string}",
-            f"Average hours per day (last 6 months): {average_hours_str}",
-            f"Number of sessions, last 7 days: {num_sessions}",
-            f"Average wifescore last 6 months is {total_wifescore_str}",
-            f"Longest combo: {long_combo_str}",
-            f"Longest marvelous combo: {long_mcombo_str}",
-            f"Fastest combo 100+ notes: {gen_fastest_combo_string(a and a.fastest_combo)}",
-            f"Fastest jack 30 notes: {gen_fastest_combo_string(a and a.fastest_jack)}",
-            f"Fastest accurate combo 100+ notes: {gen_fastest_combo_string(a and a.fastest_acc)}",
-            f"Worst unfair cb rush ever: {worst_cb_rush_string}",
-        ]
+    fastest_combo_str = gen_fastest_combo_string(a and a.fastest_combo)
+    fastest_jack_str = gen_fastest_combo_string(a and a.fastest_jack)
+    fastest_acc_str = gen_fastest_combo_string(a and a.fastest_acc)
+
+    return (
+        f"You spend {play_percentage}% of your sessions in gameplay<br>"
+        f"Total CB percentage per column (left to right): {cbs_string}<br>"
+        "Median score increase when immediately replaying a chart: "
+        f"{median_score_increase}%<br>"
+        f"Mean hit offset: {mean_string}<br>"
+        f"Overall standard deviation: {sd_string}<br>"
+        f"Average hours per day (last 6 months): {average_hours_str}<br>"
+        f"Number of sessions, last 7 days: {num_sessions}<br>"
+        f"Average wifescore last 6 months is {total_wifescore_str}<br>"
+        f"Longest combo: {long_combo_str}<br>"
+        f"Longest marvelous combo: {long_mcombo_str}<br>"
+        f"Fastest combo 100+ notes: {fastest_combo_str}<br>"
+        f"Fastest jack 30 notes: {fastest_jack_str}<br>"
+        f"Fastest accurate combo 100+ notes: {fastest_acc_str}<br>"
+        f"Worst unfair cb rush ever: {worst_cb_rush_string}"
     )
 
 
 def gen_text_most_played_packs(xml, limit=10, months: int | None = None) -> str:
     likings = generate_pack_likings(xml, months)
 
-    sorted_packs = sorted(likings, key=likings.get, reverse=True)
-    best_packs = sorted_packs[:limit]
+    if limit is None:
+        best_packs = sorted(likings, key=likings.get, reverse=True)
+    else:
+        # only the top few are needed, no need to sort every pack
+        best_packs = heapq.nlargest(limit, likings, key=likings.get)
 
+    link_color = util.link_color()
     first_line = "Most played packs (" + (
         f"last {months} months" if months else "all time"
     )
     if limit:
-        first_line += (
-            f' - <a href="toggle" style="color: {util.link_color()}">toggle</a>'
-        )
+        first_line += f' - <a href="toggle" style="color: {link_color}">toggle</a>'
     first_line += ")"
 
     text = [first_line]
@@ -959,9 +1039,7 @@ def gen_text_most_played_packs(xml, limit=10, months: int | None = None) -> str:
         text.append(f"{i+1}) {pack_str} with {likings[pack]} plays")
 
     if limit is not None:
-        text.append(
-            f'<a href="#read_more" style="color: {util.link_color()}">Show all</a>'
-        )
+        text.append(f'<a href="#read_more" style="color: {link_color}">Show all</a>')
 
     return "<br>".join(text)
 
@@ -969,29 +1047,30 @@ def gen_text_most_played_packs(xml, limit=10, months: int | None = None) -> str:
 # Calculate the median score increase, when playing a chart twice
 # in direct succession
 def calc_median_score_increase(xml):
-    from statistics import median
-
-    score_increases = []
+    table = score_table(xml)
 
-    for chart in xml.iter("ScoresAt"):
-        # Chronologically sorted scores
-        scores = sorted(iter_scores(chart), key=lambda s: s.findtext("DateTime"))
+    # Which ScoresAt each score belongs to, and the scores in chronological order within
+    # each
+    scores_at_ids = np.repeat(
+        np.arange(len(table.scores_at_starts)),
+        np.diff(table.scores_at_starts, append=len(table.scores)),
+    )
+    order = np.lexsort((table.datetimes, scores_at_ids))
+    datetimes = table.datetimes[order]
+    wifescores = table.wifescores[order]
 
-        for i in range(0, len(scores) - 1):
-            datetime_1 = parsedate(scores[i].findtext("DateTime"))
-            datetime_2 = parsedate(scores[i + 1].findtext("DateTime"))
-            time_delta = datetime_2 - datetime_1
-            play_time = float(scores[i].findtext("PlayedSeconds"))
-            idle_time = time_delta.total_seconds() - play_time
+    # Look at every pair of chronologically adjacent scores on the same chart
+    same_chart = np.diff(scores_at_ids) == 0
+    time_deltas = np.diff(datetimes) / np.timedelta64(1, "s")
+    idle_times = time_deltas - table.played_seconds[order][:-1]
 
-            # If the same chart is played twice within 60 seconds
-            if idle_time < 60:
-                score_1 = float(scores[i].findtext("SSRNormPercent"))
-                score_2 = float(scores[i + 1].findtext("SSRNormPercent"))
-                score_increase = 100 * (score_2 - score_1)
-                score_increases.append(score_increase)
+    # If the same chart is played twice within 60 seconds
+    replayed = same_chart & (idle_times < 60)
+    score_increases = 100 * np.diff(wifescores)[replayed]
 
     if len(score_increases) == 0:
         return 0
     else:
-        return median(score_increases)
+        # np.median selects the middle values with np.partition instead of sorting
+        # everything
+        return float(np.median(score_increases))
@@ -1,8 +1,9 @@
-from etterna_graph import app, util
-from etterna_graph.app import Application
-
-
 def main():
+    # Imported here so that importing this module (e.g. by PyInstaller's analysis or
+    # tooling) doesn't drag in Qt and the whole app before it's actually started
+    from etterna_graph import app, util
+    from etterna_graph.app import Application
+
     try:
         app.app = Application()
         app.app.run()
@@ -1,7 +1,7 @@
 import sys
 from typing import *
-import xml.etree.ElementTree as ET
 
+from lxml import etree
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
@@ -37,7 +37,7 @@ def show_scrollable_msgbox(text, title=None, word_wrap=False):
     msgbox.exec_()
 
 
-def show_score_info(xml: ET.Element, score: ET.Element) -> None:
+def show_score_info(xml: etree._Element, score: etree._Element) -> None:
     datetime = score.findtext("DateTime")
     wifescore = float(score.findtext("SSRNormPercent"))
     chart = util.find_parent_chart(xml, score)
@@ -94,7 +94,7 @@ def show_score_info(xml: ET.Element, score: ET.Element) -> None:
         )
 
         skillset_ssrs = score.find("SkillsetSSRs")
-        if skillset_ssrs:
+        if skillset_ssrs is not None:
             lines.append(
                 f"- Overall score rating: <b>{skillset_ssrs.findtext('Overall')}</b>"
             )
@@ -145,8 +145,18 @@ def draw(
     plot_container: QWidget,
     prefs: Settings,
 ) -> list[QWidget]:
+    # The whole tree is needed afterwards (analysis, score lookups from the plots), so
+    # it can't be streamed. Dropping the indentation whitespace and the ID table keeps
+    # it a good bit smaller
+    parser_options = {
+        "huge_tree": True,
+        "remove_blank_text": True,
+        "collect_ids": False,
+    }
     try:  # First try UTF-8
-        xmltree = ET.parse(prefs.xml_path, ET.XMLParser(encoding="UTF-8"))
+        xmltree = etree.parse(
+            prefs.xml_path, etree.XMLParser(encoding="UTF-8", **parser_options)
+        )
     except:  # If that doesn't work, fall back to system encoding
         os_encoding = sys.getdefaultencoding()
 
@@ -158,10 +168,10 @@ def draw(
         util.logger.exception(
             f"XML parsing with UTF-8 failed, falling back to {os_encoding}"
         )
-        xmltree: ET.ElementTree = ET.parse(
-            prefs.xml_path, ET.XMLParser(encoding=os_encoding)
+        xmltree: etree._ElementTree = etree.parse(
+            prefs.xml_path, etree.XMLParser(encoding=os_encoding, **parser_options)
         )
-    xml: ET.Element = xmltree.getroot()
+    xml: etree._Element = xmltree.getroot()
 
     analysis = replays_analysis.analyze(xml, prefs.replays_dir)
 
@@ -395,10 +405,7 @@ def draw(
             data=(
                 (
                     analysis.wife2_wifescores,
-                    [
-                        float(score.findtext("SSRNormPercent"))
-                        for score in analysis.scores
-                    ],
+                    [util.SSR_NORM_PERCENT(score) for score in analysis.scores],
                 ),
                 analysis.scores,
             ),
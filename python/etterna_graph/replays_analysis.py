@@ -1,12 +1,25 @@
 from dataclasses import dataclass
 import os
 from typing import *
-from xml.etree.ElementTree import Element
+
+from lxml import etree
+from lxml.etree import _Element as Element
+import numpy as np
 
 from etterna_graph import app, util
 from etterna_graph.savegame_analysis import ReplaysAnalysis as RustReplaysAnalysis
 from etterna_graph.savegame_analysis import FastestComboInfo
-from etterna_graph.util import parsedate
+
+
+# XPath expressions evaluated once per score in `analyze`. Compiling them up front means
+# lxml doesn't have to re-parse the path on every call
+_GRADE = etree.XPath("string(Grade)")
+_DATETIME = etree.XPath("string(DateTime)")
+# Sums up the judgements of every score in the document in a single libxml2 evaluation
+_TOTAL_NOTES = etree.XPath(
+    "sum(//TapNoteScores/Miss) + sum(//TapNoteScores/W1) + sum(//TapNoteScores/W2)"
+    " + sum(//TapNoteScores/W3) + sum(//TapNoteScores/W4) + sum(//TapNoteScores/W5)"
+)
 
 
 @dataclass
@@ -21,7 +34,7 @@ class FastestCombo:
 class ReplaysAnalysis:
     def __init__(self):
         self.scores = []
-        self.datetimes = []
+        self.datetimes: np.ndarray = np.array([], dtype="datetime64[s]")
         self.manipulations: list[float] = []
         self.wife2_wifescores: list[float] | None = (
             None  # this one doesn't need timingdata
@@ -92,12 +105,14 @@ def analyze(xml: Element, replays: str) -> ReplaysAnalysis | None:
 
     r = ReplaysAnalysis()
 
-    chartkeys: list[str] = []
-    wifescores: list[float] = []
-    packs: list[str] = []
-    songs: list[str] = []
-    rates: list[float] = []
-    all_scores: list[Element] = []
+    # One (scorekey, wifescore, pack, song, rate, score) tuple per score. Those are
+    # transposed into the per-field lists for Rust in one go after the walk, instead of
+    # appending to six lists
+    rows: list[tuple[str, float, str, str, float, Element]] = []
+    # used to resolve the scorekeys returned by the Rust analysis without searching the
+    # xml again
+    score_by_key: dict[str, Element] = {}
+    chart_by_scorekey: dict[str, Element] = {}
     for chart in xml.iter("Chart"):
         pack = chart.get("Pack")
         song = chart.get("Song")
@@ -109,25 +124,27 @@ def analyze(xml: Element, replays: str) -> ReplaysAnalysis | None:
             continue  # this file is borked
 
         for scoresat in chart:
-            rate = (
-                float(rate_str)
-                if (rate_str := scoresat.get("Rate") is not None)
-                else 0.0
-            )
+            # scores without a rate attribute were played at the default 1.0x rate
+            rate_str = scoresat.get("Rate")
+            rate = float(rate_str) if rate_str is not None else 1.0
             for score in scoresat:
                 # We exclude failed scores because those exhibit some.. weird behavior in the replay
                 # file. not sure what exactly it is, but somehow the wifescore in the xml doesn't
                 # match the wifescore we get when recalculating it manually using the replay file
                 # We don't want such outliers in our graphs, so - be gone, failed scores
-                if score.findtext("Grade") == "Failed":
+                if _GRADE(score) == "Failed":
                     continue
 
-                chartkeys.append(score.get("Key"))
-                wifescores.append(float(score.findtext("SSRNormPercent")))
-                packs.append(pack)
-                songs.append(song)
-                rates.append(rate)
-                all_scores.append(score)
+                scorekey = score.get("Key")
+                rows.append(
+                    (scorekey, util.SSR_NORM_PERCENT(score), pack, song, rate, score)
+                )
+                score_by_key[scorekey] = score
+                chart_by_scorekey[scorekey] = chart
+
+    chartkeys, wifescores, packs, songs, rates, all_scores = (
+        [list(column) for column in zip(*rows)] if rows else [[] for _ in range(6)]
+    )
 
     prefix = os.path.join(replays, "a")[:-1]  # why?
     print("Starting replays analysis...")
@@ -161,10 +178,7 @@ def analyze(xml: Element, replays: str) -> ReplaysAnalysis | None:
     # this is NOT part of replays analysis. this is xml analysis. this is in here anyway because
     # it's easier. this should really be moved into a separate xml analysis module (in case I'll
     # ever get around implementing that...?)
-    r.total_notes = 0
-    for tap_note_scores in xml.iter("TapNoteScores"):
-        judgements = ["Miss", "W1", "W2", "W3", "W4", "W5"]
-        r.total_notes += sum(int(tap_note_scores.findtext(x)) for x in judgements)
+    r.total_notes = int(_TOTAL_NOTES(xml))
 
     r.wife2_wifescores = rustr.wife2_wifescores
     r.offset_mean = rustr.deviation_mean
@@ -173,8 +187,13 @@ def analyze(xml: Element, replays: str) -> ReplaysAnalysis | None:
     r.num_near_hits = sum(r.notes_per_column) / sum(r.cbs_per_column)
     r.standard_deviation = rustr.standard_deviation
 
-    for i, num_hits in enumerate(rustr.sub_93_offset_buckets):
-        r.sub_93_offset_buckets[i - 180] = num_hits
+    # the Rust buckets are indexed from the -180ms offset onwards
+    r.sub_93_offset_buckets = dict(
+        zip(
+            range(-180, -180 + len(rustr.sub_93_offset_buckets)),
+            rustr.sub_93_offset_buckets,
+        )
+    )
 
     r.current_wifescores = rustr.current_wifescores
     r.new_wifescores = rustr.new_wifescores
@@ -183,22 +202,18 @@ def analyze(xml: Element, replays: str) -> ReplaysAnalysis | None:
         all_scores[i] for i in rustr.timing_info_dependent_score_indices
     ]
     r.scores = [all_scores[score_index] for score_index in rustr.score_indices]
-    r.datetimes = [parsedate(score.findtext("DateTime")) for score in r.scores]
+    # numpy parses the whole batch of DateTime strings in C, including the midnight ones
+    # where Etterna leaves out the time part
+    r.datetimes = np.array(
+        [_DATETIME(score) for score in r.scores], dtype="datetime64[s]"
+    )
 
     # replace the scorekeys returned from Rust replays analysis with the actual score elements
-    for score in r.scores:
-        scorekey = score.get("Key")
-        if scorekey == rustr.longest_mcombo[1]:
-            r.longest_mcombo = (
-                rustr.longest_mcombo[0],
-                util.find_parent_chart(xml, score),
-            )
-        if scorekey == rustr.fastest_combo_scorekey:
-            r.fastest_combo.score = score
-        if scorekey == rustr.fastest_jack_scorekey:
-            r.fastest_jack.score = score
-        if scorekey == rustr.fastest_acc_scorekey:
-            r.fastest_acc.score = score
+    if (chart := chart_by_scorekey.get(rustr.longest_mcombo[1])) is not None:
+        r.longest_mcombo = (rustr.longest_mcombo[0], chart)
+    r.fastest_combo.score = score_by_key.get(rustr.fastest_combo_scorekey)
+    r.fastest_jack.score = score_by_key.get(rustr.fastest_jack_scorekey)
+    r.fastest_acc.score = score_by_key.get(rustr.fastest_acc_scorekey)
 
     # print(r.fastest_acc)
     # print(rustr.fastest_acc_scorekey)
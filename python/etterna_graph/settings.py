@@ -113,6 +113,16 @@ SETTINGS_ENTRIES = [
         is_necessary=False,
         settings_type=SettingsType.Checkbox,
     ),
+    # opt-in, because OpenGL driver support is too hit-and-miss to make this the default
+    SettingsEntry(
+        python_name="use_opengl",
+        json_name="use-opengl",
+        display_name="Render plots with OpenGL (needs restart)",
+        default_value=False,
+        write_if_default=True,
+        is_necessary=False,
+        settings_type=SettingsType.Checkbox,
+    ),
     # only write color config value if they differ from the default. otherwise all users will
     # have the color config as of now hard-coded in their settings, and color config changes
     # in a future update won't be applied
@@ -190,6 +200,7 @@ class Settings:
         self.songs_root: str | None
         self.enable_all_plots: bool
         self.hide_invalidated: bool
+        self.use_opengl: bool
         self.bg_color: str
         self.text_color: str
         self.border_color: str
@@ -1,8 +1,12 @@
-from datetime import datetime, timedelta
+import bisect
+import functools
 import logging
 import math
+import re
 from typing import *
-from xml.etree.ElementTree import Element
+
+from lxml import etree
+from lxml.etree import _Element as Element
 
 from etterna_graph import app
 
@@ -43,21 +47,47 @@ AAA_THRESHOLD = GRADE_THRESHOLDS[5]
 AAAA_THRESHOLD = GRADE_THRESHOLDS[6]
 AAAAA_THRESHOLD = GRADE_THRESHOLDS[7]
 
+# Score selectors for `iter_scores`, compiled once so the filtering runs inside libxml2.
+# Scores with an unreasonably high rating are always skipped; invalidated scores only if
+# the user chose to hide them
+_LEGIT_SCORES = etree.XPath(
+    "descendant-or-self::Chart/ScoresAt/Score[not(SkillsetSSRs/Overall > 40)]"
+)
+_LEGIT_SCORES_HIDE_INVALIDATED = etree.XPath(
+    "descendant-or-self::Chart/ScoresAt/Score[not(SkillsetSSRs/Overall > 40)]"
+    "[not(EtternaValid = '0')]"
+)
+# Sum of every TapNoteScores counter (mines included) of a score, for `num_notes`
+_NUM_NOTES = etree.XPath("sum(TapNoteScores/*)")
+# The wifescore of a score, NaN if it has none. Shared by all modules that read scores
+SSR_NORM_PERCENT = etree.XPath("number(SSRNormPercent)")
+
+
+# The application's Settings object, set once on startup via `set_prefs`. The color
+# accessors below read from it directly instead of going through `app.app.prefs` on
+# every call
+_prefs: Any = None
+
+
+def set_prefs(prefs) -> None:
+    global _prefs
+    _prefs = prefs
+
 
 def bg_color():
-    return app.app.prefs.bg_color
+    return _prefs.bg_color
 
 
 def text_color():
-    return app.app.prefs.text_color
+    return _prefs.text_color
 
 
 def border_color():
-    return app.app.prefs.border_color
+    return _prefs.border_color
 
 
 def link_color():
-    return app.app.prefs.link_color
+    return _prefs.link_color
 
 
 _keep_storage = []
@@ -68,58 +98,33 @@ def keep(*args):  # an escape hatch of Python's GC
 
 
 def wifescore_to_grade_string(wifescore: float) -> str:
-    for grade_name, grade_threshold in list(zip(GRADE_NAMES, GRADE_THRESHOLDS))[::-1]:
-        if wifescore >= grade_threshold:
-            return grade_name
-    logger.exception("this shouldn't happen")
-    return "aaaaaaaaaaaaaaaa"
+    # The lowest threshold is -inf, so only NaN can miss every grade
+    if math.isnan(wifescore):
+        logger.exception("this shouldn't happen")
+        return "aaaaaaaaaaaaaaaa"
+    return GRADE_NAMES[bisect.bisect_right(GRADE_THRESHOLDS, wifescore) - 1]
 
 
 def num_notes(score: Any) -> int:
-    return sum([int(e.text) for e in score.find("TapNoteScores")])
+    return int(_NUM_NOTES(score))
 
 
-def extract_strs(string: str, before: str, after: str) -> Generator[str, None, None]:
-    start_index = 0
-    while True:
-        before_index = string.find(before, start_index)
-        if before_index == -1:
-            break
+@functools.lru_cache(maxsize=None)
+def _extract_pattern(before: str, after: str) -> re.Pattern[str]:
+    return re.compile(re.escape(before) + r"(.*?)" + re.escape(after), re.DOTALL)
 
-        after_index = string.find(after, before_index)
-        if after_index == -1:
-            start_index = after_index + 1  # the next occurence that's not this one
-            continue
 
-        yield string[before_index + len(before) + 1 : after_index]
-        start_index = after_index + len(after)
+# Yields every substring enclosed by `before` and `after`, like extract_str in the Rust
+# crate
+def extract_strs(string: str, before: str, after: str) -> Generator[str, None, None]:
+    for match in _extract_pattern(before, after).finditer(string):
+        yield match.group(1)
 
 
 def extract_str(string: str, before: str, after: str) -> Optional[str]:
     return next(extract_strs(string, before, after), None)
 
 
-# Parses date in Etterna.xml format
-def parsedate(s: str) -> datetime:
-    try:
-        return datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
-    except ValueError:
-        # in this case this datetime is on midnight, in which case Etterna omits the time part
-        # of the datetime. Weird behavior, but true. Found by snover
-        return datetime.strptime(s, "%Y-%m-%d")
-
-
-def score_within_n_months(score: Element, months: int | None = None) -> bool:
-    if months is None:
-        return True
-
-    if (datetime_text := score.findtext("DateTime")) is not None:
-        time_delta = datetime.now() - parsedate(datetime_text)
-        return time_delta <= timedelta(365 / 12 * months)
-
-    return True
-
-
 def iter_scores(xml: Element) -> Generator[Element, None, None]:
     """Returns a generator of all scores in the XML file.
 
@@ -180,21 +185,10 @@ def iter_scores(xml: Element) -> Generator[Element, None, None]:
     :returns: A generator of scores.
     :rtype: Generator[Element, None, None]
     """
-    for chart in xml.iter("Chart"):
-        for score in chart.iter("Score"):
-            # is the score rating unreasonably high?
-            skillset_ssrs = score.find("SkillsetSSRs")
-            if skillset_ssrs is not None:
-                overall_ssr = float(skillset_ssrs.findtext("Overall"))
-                if overall_ssr > 40:
-                    continue
-
-            # is the score invalid (only if invalidated scores aren't shown)
-            if score.findtext("EtternaValid") == "0" and app.app.prefs.hide_invalidated:
-                continue
-
-            # this score looks legit
-            yield score
+    if app.app.prefs.hide_invalidated:
+        yield from _LEGIT_SCORES_HIDE_INVALIDATED(xml)
+    else:
+        yield from _LEGIT_SCORES(xml)
 
 
 # Convert a float of hours to a string, e.g. "5h 35min"
@@ -205,47 +199,32 @@ def timespan_str(hours):
     return f"{hours}h {minutes}min"
 
 
-cache_data = {}
-
-T = TypeVar("T")
-
-
-def cache(key, data: T | None = None) -> T | None:
-    global cache_data
-
-    if data is not None:  # If data was given, update cache
-        cache_data[key] = data
-        return data
-    return cache_data.get(key)  # Return cached data
+# Score key -> parent chart, built on the first lookup so that repeated lookups don't
+# walk the whole tree each time. Only the index for the most recently used XML is kept
+@functools.lru_cache(maxsize=1)
+def _parent_chart_index(xml: Element) -> dict[str, Element]:
+    index: dict[str, Element] = {}
+    for chart in xml.iter("Chart"):
+        for score in chart.iter("Score"):
+            # Keep the first chart like the previous document-order XPath lookup did
+            index.setdefault(score.get("Key"), chart)
+    return index
 
 
 def find_parent_chart(xml: Element, score: Element):
-    score_key = score.get("Key")
-    return xml.find(f'.//Score[@Key="{score_key}"]/../..')
+    return _parent_chart_index(xml).get(score.get("Key"))
 
 
 # Abbreviates a number, e.g. (with default `min_precision`):
 #  1367897 -> 1367k
 #  47289361 -> 47M
 # The min_precision parameter controls how many digits must be visible minimum
-def abbreviate(n, min_precision=2):
-    num_digits = len(str(n))
-    postfix_index = int((num_digits - min_precision) / 3)
-    postfix = ["", "k", "M", "B", "T", "Q"][postfix_index]
-    return str(round(n / 1000**postfix_index)) + postfix
-
+_ABBREVIATION_POSTFIXES = ("", "k", "M", "B", "T", "Q")
+_ABBREVIATION_DIVISORS = tuple(1000**i for i in range(len(_ABBREVIATION_POSTFIXES)))
 
-def groupby(iterator, keyfunc):
-    prev_key = None
-    group = []
-    for value in iterator:
-        key = (keyfunc)(value)
 
-        if key == prev_key:
-            group.append(value)
-        else:
-            yield prev_key, group
-            prev_key = key
-            group = []
-
-    yield prev_key, group
+def abbreviate(n, min_precision=2):
+    num_digits = 1 if n == 0 else int(math.log10(abs(n))) + 1
+    postfix_index = int((num_digits - min_precision) / 3)
+    abbreviated = round(n / _ABBREVIATION_DIVISORS[postfix_index])
+    return f"{abbreviated}{_ABBREVIATION_POSTFIXES[postfix_index]}"
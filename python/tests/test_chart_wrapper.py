@@ -0,0 +1,46 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import pytest
+from PyQt5.QtWidgets import QApplication
+
+from etterna_graph import chart_wrapper
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def qt_errors(monkeypatch):
+    # Exceptions raised in Qt slots and paint events don't propagate, they're passed to
+    # the excepthook
+    errors = []
+    monkeypatch.setattr(sys, "excepthook", lambda *exc_info: errors.append(exc_info[1]))
+    return errors
+
+
+@pytest.mark.parametrize(
+    "flags", ["time_xaxis step thick_line", "time_xaxis step large"]
+)
+def test_step_plot_survives_zooming_in(qapp, qt_errors, flags):
+    datetimes = [datetime(2024, 1, 1) + timedelta(days=i) for i in range(50)]
+    widget = chart_wrapper.draw(
+        (datetimes, list(range(50))), type_="line", flags=flags, color="#ffff00"
+    )
+    widget.resize(400, 300)
+    widget.show()
+    qapp.processEvents()
+
+    # narrow the view to inside the data range, which makes pyqtgraph re-clip the curve
+    widget.getPlotItem().setXRange(
+        datetimes[10].timestamp(), datetimes[20].timestamp(), padding=0
+    )
+    qapp.processEvents()
+    widget.grab()
+
+    assert qt_errors == []